@@ -0,0 +1,274 @@
+import argparse
+import json
+import random
+import sys
+import time
+
+import cribbage
+import mcts
+import scoring
+from kalah import Kalah
+from peg_game import PeggingGame
+from pegging_solver import PeggingSolver
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def kalah_positions(board, count, seed):
+    ''' Returns a list of nonterminal positions reached by playing random
+        moves from the initial position of the given board.
+
+        board -- a Kalah board
+        count -- a positive integer
+        seed -- the seed for the random moves
+    '''
+    rng = random.Random(seed)
+    positions = []
+    while len(positions) < count:
+        pos = board.initial_state()
+        while not pos.is_terminal() and len(positions) < count:
+            positions.append(pos)
+            pos = pos.successor(rng.choice(pos.get_actions()))
+    return positions
+
+
+def pegging_positions(game, count, seed):
+    ''' Returns a list of nonterminal pegging positions reached by playing
+        random moves from seeded deals of the given pegging game.
+
+        game -- a PeggingGame
+        count -- a positive integer
+        seed -- the seed for the deals and the random moves
+    '''
+    random.seed(seed)
+    positions = []
+    while len(positions) < count:
+        pos = game.initial_state()
+        while not pos.is_terminal() and len(positions) < count:
+            positions.append(pos)
+            pos = pos.successor(random.choice(pos.get_actions()))
+    return positions
+
+
+def bench_kalah_successor(seed):
+    positions = kalah_positions(Kalah(6, 4), 200, seed)
+    pairs = [(pos, move) for pos in positions for move in pos.get_actions()]
+    def run():
+        for pos, move in pairs:
+            pos.successor(move)
+        return len(pairs)
+    return run
+
+
+def bench_pegging_successor(seed):
+    positions = pegging_positions(PeggingGame(4), 200, seed)
+    pairs = [(pos, move) for pos in positions for move in pos.get_actions()]
+    def run():
+        for pos, move in pairs:
+            pos.successor(move)
+        return len(pairs)
+    return run
+
+
+def bench_pegging_score(seed):
+    game = cribbage.Game()
+    positions = pegging_positions(PeggingGame(4), 200, seed)
+    plays = [(pos._history, card, pos.actor()) for pos in positions for card in pos.get_actions()]
+    def run():
+        for history, card, player in plays:
+            history.score(game, card, player)
+        return len(plays)
+    return run
+
+
+def bench_hand_score(seed):
+    game = cribbage.Game()
+    random.seed(seed)
+    hands = []
+    for i in range(200):
+        cards = game.deal(5)
+        hands.append((cards[:4], cards[4], i % 2 == 0))
+    def run():
+        for hand, turn, crib in hands:
+            scoring.score(game, hand, turn, crib)
+        return len(hands)
+    return run
+
+
+def bench_greedy_throw(seed, cached=False):
+    game = cribbage.Game()
+    if cached:
+        game.set_scorer(scoring.ScoreCache(game))
+    random.seed(seed)
+    deals = [game.deal(6) for i in range(20)]
+    def run():
+        random.seed(seed)
+        for deal in deals:
+            scoring.greedy_throw(game, deal, 1)
+        return len(deals)
+    return run
+
+
+def bench_kalah_rollout(seed):
+    nodes = [mcts.Node(pos) for pos in kalah_positions(Kalah(6, 4), 20, seed)]
+    def run():
+        rng = mcts.search_rng(seed, 0)
+        for node in nodes:
+            node.simulate(rng)
+        return len(nodes)
+    return run
+
+
+def bench_pegging_rollout(seed):
+    nodes = [mcts.Node(pos) for pos in pegging_positions(PeggingGame(4), 20, seed)]
+    def run():
+        rng = mcts.search_rng(seed, 0)
+        for node in nodes:
+            node.simulate(rng)
+        return len(nodes)
+    return run
+
+
+def bench_pegging_solve(seed):
+    random.seed(seed)
+    game = PeggingGame(4)
+    deals = [game.initial_state() for i in range(5)]
+    def run():
+        solver = PeggingSolver()
+        for pos in deals:
+            solver.value(pos)
+        return len(deals)
+    return run
+
+
+def bench_search(pos):
+    def run():
+        stats = mcts.SearchStats()
+        mcts.monte_carlo_tree_search(pos, 0.05, stats)
+        return stats.iterations
+    return run
+
+
+# name -> (unit, function that takes a seed and returns a function that runs the
+# benchmark once and returns the number of units of work done)
+BENCHMARKS = {
+    "kalah_successor": ("successors", bench_kalah_successor),
+    "pegging_successor": ("successors", bench_pegging_successor),
+    "pegging_score": ("plays", bench_pegging_score),
+    "hand_score": ("hands", bench_hand_score),
+    "greedy_throw": ("deals", bench_greedy_throw),
+    "greedy_throw_cached": ("deals", lambda seed: bench_greedy_throw(seed, True)),
+    "kalah_rollout": ("rollouts", bench_kalah_rollout),
+    "pegging_rollout": ("rollouts", bench_pegging_rollout),
+    "pegging_solve": ("hands", bench_pegging_solve),
+    "kalah_search": ("iterations", lambda seed: bench_search(kalah_positions(Kalah(6, 4), 1, seed)[0])),
+    "pegging_search": ("iterations", lambda seed: bench_search(pegging_positions(PeggingGame(4), 1, seed)[0])),
+}
+
+
+def measure(run, min_time, repeat):
+    ''' Returns the best rate, in units of work per second, over the given
+        number of trials of the given benchmark.  Each trial runs the benchmark
+        repeatedly for at least the given time.
+
+        run -- a function that runs a benchmark once and returns the work done
+        min_time -- a positive number of seconds
+        repeat -- a positive integer
+    '''
+    best = 0.0
+    for trial in range(repeat):
+        work = 0
+        start = time.perf_counter()
+        elapsed = 0.0
+        while elapsed < min_time:
+            work += run()
+            elapsed = time.perf_counter() - start
+        best = max(best, work / elapsed)
+    return best
+
+
+def run_benchmarks(names, seed, min_time, repeat):
+    ''' Runs the given benchmarks and returns a dictionary mapping each name
+        to a dictionary giving its unit and rate.
+
+        names -- an iterable over keys in BENCHMARKS
+        seed -- an integer
+        min_time -- a positive number of seconds per trial
+        repeat -- a positive integer
+    '''
+    results = dict()
+    for name in names:
+        unit, setup = BENCHMARKS[name]
+        rate = measure(setup(seed), min_time, repeat)
+        results[name] = {"unit": unit, "per_sec": rate}
+    return results
+
+
+def compare(results, baseline, tolerance):
+    ''' Returns a list of (name, rate, baseline rate) triples for the
+        benchmarks whose rate is more than the given fraction below their
+        rate in the baseline.  Benchmarks missing from the baseline are ignored.
+
+        results -- a dictionary returned by run_benchmarks
+        baseline -- a dictionary returned by run_benchmarks
+        tolerance -- a nonnegative number
+    '''
+    regressions = []
+    for name, result in results.items():
+        if name in baseline:
+            old = baseline[name]["per_sec"]
+            if result["per_sec"] < old * (1.0 - tolerance):
+                regressions.append((name, result["per_sec"], old))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark game engines and search")
+    parser.add_argument('names', nargs='*', help='benchmarks to run (default=all): ' + ", ".join(BENCHMARKS))
+    parser.add_argument('--seed', dest='seed', type=int, action='store', default=19, help='seed for the benchmark positions (default=19)')
+    parser.add_argument('--time', dest='time', type=float, action='store', default=0.5, help='minimum seconds per trial (default=0.5)')
+    parser.add_argument('--repeat', dest='repeat', type=int, action='store', default=3, help='trials per benchmark; the best is reported (default=3)')
+    parser.add_argument('--save', dest='save', action='store', default=None, help='file to save the results to as JSON')
+    parser.add_argument('--baseline', dest='baseline', action='store', default=None, help='JSON results file to compare against')
+    parser.add_argument('--tolerance', dest='tolerance', type=float, action='store', default=0.1, help='allowed fractional slowdown relative to the baseline (default=0.1)')
+    args = parser.parse_args()
+
+    try:
+        for name in args.names:
+            if name not in BENCHMARKS:
+                raise BenchmarkError("unknown benchmark " + name)
+        if args.time <= 0:
+            raise BenchmarkError("time must be positive")
+        if args.repeat < 1:
+            raise BenchmarkError("repeat must be positive")
+        if args.tolerance < 0:
+            raise BenchmarkError("tolerance must be nonnegative")
+
+        baseline = None
+        if args.baseline is not None:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+
+        results = run_benchmarks(args.names or list(BENCHMARKS), args.seed, args.time, args.repeat)
+        for name, result in results.items():
+            line = "%-20s %12.1f %s/sec" % (name, result["per_sec"], result["unit"])
+            if baseline is not None and name in baseline:
+                line += " (%+.1f%%)" % (100.0 * (result["per_sec"] / baseline[name]["per_sec"] - 1.0))
+            print(line)
+
+        if args.save is not None:
+            with open(args.save, "w") as f:
+                json.dump(results, f, indent=2)
+
+        if baseline is not None:
+            regressions = compare(results, baseline, args.tolerance)
+            for name, rate, old in regressions:
+                print("REGRESSION: %s %.1f/sec vs. baseline %.1f/sec" % (name, rate, old))
+            if regressions:
+                sys.exit(1)
+        sys.exit(0)
+    except (BenchmarkError, OSError, ValueError) as err:
+        print(sys.argv[0] + ":", str(err))
+        sys.exit(1)
@@ -8,11 +8,27 @@ from pegging import Pegging
 
 class Game:
     def __init__(self):
+        self._scorer = scoring.score
         # make this a tuple so it is immutable and so doesn't need to be copied
         # in the accessor?
         self._throw_indices = list(it.combinations(range(self.keep_cards() + self.throw_cards()), self.throw_cards()))
 
         
+    def set_scorer(self, scorer):
+        """ Sets the function used to score hands in this game.
+
+            scorer -- a function that takes the same arguments as scoring.score
+                      and returns the same result, such as a scoring.ScoreCache
+                      for this game
+        """
+        self._scorer = scorer
+
+
+    def hand_score(self, hand, turn, crib):
+        """ Returns the score of the given hand as scoring.score does. """
+        return self._scorer(self, hand, turn, crib)
+
+
     def all_ranks(self):
         return range(1, 14)
 
@@ -181,8 +197,19 @@ class Game:
         return part_size == len(hand)
     
 
-    def play(self, p0_policy, p1_policy, log):
+    def play(self, p0_policy, p1_policy, log, views=False):
+        """ Plays a game between the given policies and returns the game value
+            and the number of hands played.  Policies are given deep copies of
+            their cards unless views is true, in which case they are given
+            tuples, which is faster but requires that policies not modify the
+            cards they are given.
+
+            p0_policy, p1_policy -- objects with keep and peg methods
+            log -- a function that takes a message
+            views -- true to pass tuples of cards to the policies
+        """
         scores = [0, 0]
+        cards_for_policy = tuple if views else copy.deepcopy
         policies = [p0_policy, p1_policy]
         dealer = 0
         handsPlayed = 0
@@ -196,7 +223,7 @@ class Game:
             hands = [in_play[per_player * p : per_player * (p + 1)] for p in [0, 1]]
             handsPlayed += 1
             turn = in_play[-1]
-            keeps = [policies[p].keep(copy.deepcopy(hands[p]),
+            keeps = [policies[p].keep(cards_for_policy(hands[p]),
                                       scores[:] if p == 0
                                                else list(reversed(scores)),
                                       dealer == p)
@@ -221,7 +248,7 @@ class Game:
             last_played = 0
             while max(scores) < self.winning_score() and (sum(len(cards) for cards in peg_cards) > 0 or not history.is_start_round()):
                 if not passes[peg_turn]:
-                    play = policies[peg_turn].peg(copy.deepcopy(peg_cards[peg_turn]), history, scores[:] if peg_turn == 0 else list(reversed(scores)), dealer == peg_turn)
+                    play = policies[peg_turn].peg(cards_for_policy(peg_cards[peg_turn]), history, scores[:] if peg_turn == 0 else list(reversed(scores)), dealer == peg_turn)
 
                     # check legality of play
                     if play is None and history.has_legal_play(self, peg_cards[peg_turn], 0 if peg_turn == dealer else 1):
@@ -264,14 +291,14 @@ class Game:
 
             # score non-dealer's hand
             if max(scores) < self.winning_score():
-                hand_score = scoring.score(self, keeps[1 - dealer][0], turn, False)
+                hand_score = self.hand_score(keeps[1 - dealer][0], turn, False)
                 log("NON-DEALER: " + str(keeps[1 - dealer][0]) + " " + str(hand_score))
                 scores[1 - dealer] += hand_score[0]
                 log(scores)
 
             # score dealer's hand
             if max(scores) < self.winning_score():
-                hand_score = scoring.score(self, keeps[dealer][0], turn, False)
+                hand_score = self.hand_score(keeps[dealer][0], turn, False)
                 log("DEALER: " + str(keeps[dealer][0]) + " " + str(hand_score))
                 scores[dealer] += hand_score[0]
                 log(scores)
@@ -279,7 +306,7 @@ class Game:
             # score crib
             if max(scores) < self.winning_score():
                 crib = keeps[dealer][1] + keeps[1 - dealer][1]
-                hand_score = scoring.score(self, crib, turn, True)
+                hand_score = self.hand_score(crib, turn, True)
                 log("CRIB: " + str(crib) + str(hand_score))
                 scores[dealer] += hand_score[0]
                 log(scores)
@@ -0,0 +1,150 @@
+import argparse
+import os
+import random
+import sys
+import time
+from multiprocessing import Pool
+
+import cribbage
+import scoring
+from cribbage_mcts import MCTSPolicy
+
+
+class EvaluationError(Exception):
+    pass
+
+
+class GreedyPolicy:
+    """ Keeps the cards chosen by greedy_throw and pegs the legal card that
+        scores the most points immediately.
+    """
+    def __init__(self, game):
+        self._game = game
+
+
+    def keep(self, hand, scores, am_dealer):
+        keep, throw, _ = scoring.greedy_throw(self._game, list(hand), 1 if am_dealer else -1)
+        return keep, throw
+
+
+    def peg(self, cards, history, scores, am_dealer):
+        player = 0 if am_dealer else 1
+        best = None
+        best_score = -1
+        for card in cards:
+            if history.is_legal(self._game, card, player):
+                points = history.score(self._game, card, player)
+                if points > best_score:
+                    best = card
+                    best_score = points
+        return best
+
+
+class RandomPolicy:
+    """ Keeps and pegs uniformly at random. """
+    def __init__(self, game):
+        self._game = game
+
+
+    def keep(self, hand, scores, am_dealer):
+        throw = set(random.choice(self._game.throw_indices()))
+        return [c for i, c in enumerate(hand) if i not in throw], [c for i, c in enumerate(hand) if i in throw]
+
+
+    def peg(self, cards, history, scores, am_dealer):
+        player = 0 if am_dealer else 1
+        legal = [c for c in cards if history.is_legal(self._game, c, player)]
+        return random.choice(legal) if legal else None
+
+
+# name -> function that takes a game and a seed and returns a policy; policies
+# are created by name in the workers so that only names need to be sent to them
+POLICIES = {
+    "greedy": lambda game, seed: GreedyPolicy(game),
+    "random": lambda game, seed: RandomPolicy(game),
+    "mcts": lambda game, seed: MCTSPolicy(game, keep_time=0.05, peg_time=0.02, seed=seed),
+}
+
+
+def play_games(args):
+    """ Plays a batch of games in a worker process and returns a dictionary
+        mapping each game value (from P0's point of view) to the number of
+        games with that value, and the total number of hands played.  P0 deals
+        first in even-numbered games and second in odd-numbered ones, as in
+        cribbage.evaluate_policies.  The policies are created afresh for each
+        game, with seeds that depend on the game's index.
+
+        args -- a (P0 policy name, P1 policy name, first game index, number of
+                games, seed) tuple
+    """
+    p0_name, p1_name, first, count, seed = args
+    game = cribbage.Game()
+    game.set_scorer(scoring.ScoreCache(game))
+    scores = dict()
+    total_hands = 0
+    for g in range(first, first + count):
+        # each game has its own streams so deals and searches don't depend
+        # on the batching
+        random.seed("%d:%d" % (seed, g))
+        p0_policy = POLICIES[p0_name](game, seed * 100003 + 2 * g)
+        p1_policy = POLICIES[p1_name](game, seed * 100003 + 2 * g + 1)
+        if g % 2 == 0:
+            value, hands = game.play(p0_policy, p1_policy, lambda mess: None, views=True)
+        else:
+            value, hands = game.play(p1_policy, p0_policy, lambda mess: None, views=True)
+            value = -value
+        scores[value] = scores.get(value, 0) + 1
+        total_hands += hands
+    return scores, total_hands
+
+
+def evaluate_policies(p0_name, p1_name, count, workers, seed=19, batch=100):
+    """ Plays the given number of games between the named policies in a pool
+        of worker processes and returns the same summary as
+        cribbage.evaluate_policies: the net points per game for P0, the points
+        per game won by each policy, the distribution of game values, and the
+        average number of hands per game.
+
+        p0_name, p1_name -- keys in POLICIES
+        count -- a positive integer
+        workers -- the number of worker processes
+        seed -- the seed for the deals and the policies
+        batch -- the number of games each worker plays per task
+    """
+    tasks = [(p0_name, p1_name, first, min(batch, count - first), seed) for first in range(0, count, batch)]
+    scores = dict()
+    total_hands = 0
+    with Pool(workers) as pool:
+        for batch_scores, hands in pool.imap_unordered(play_games, tasks):
+            for value, games in batch_scores.items():
+                scores[value] = scores.get(value, 0) + games
+            total_hands += hands
+    p0_total = sum(value * games for value, games in scores.items() if value > 0)
+    p1_total = sum(-value * games for value, games in scores.items() if value < 0)
+    return (p0_total - p1_total) / count, p0_total / count, p1_total / count, scores, total_hands / count
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Evaluate cribbage policies over many games in parallel")
+    parser.add_argument('p0', choices=sorted(POLICIES), help='policy to evaluate')
+    parser.add_argument('p1', choices=sorted(POLICIES), help='opposing policy')
+    parser.add_argument('--count', dest='count', type=int, action='store', default=1000, help='number of games (default=1000)')
+    parser.add_argument('--workers', dest='workers', type=int, action='store', default=os.cpu_count(), help='worker processes (default=number of CPUs)')
+    parser.add_argument('--batch', dest='batch', type=int, action='store', default=100, help='games per worker task (default=100)')
+    parser.add_argument('--seed', dest='seed', type=int, action='store', default=19, help='seed for deals and policies (default=19)')
+    args = parser.parse_args()
+
+    try:
+        if args.count < 1 or args.batch < 1:
+            raise EvaluationError("count and batch must be positive")
+        if args.workers is None or args.workers < 1:
+            raise EvaluationError("workers must be positive")
+        start = time.time()
+        net, p0_points, p1_points, scores, hands = evaluate_policies(args.p0, args.p1, args.count, args.workers, args.seed, args.batch)
+        print("NET: %.4f; P0: %.4f; P1: %.4f; HANDS: %.2f; TIME: %.1fs" % (net, p0_points, p1_points, hands, time.time() - start))
+        for value in sorted(scores):
+            print("%+d: %d" % (value, scores[value]))
+        sys.exit(0)
+    except EvaluationError as err:
+        print(sys.argv[0] + ":", str(err))
+        sys.exit(1)
@@ -0,0 +1,145 @@
+import random
+from concurrent.futures import ProcessPoolExecutor
+from time import time
+
+import mcts
+from peg_game import PeggingGame
+
+
+def search_determinization(data, duration, seed, decision, stream):
+    """ Searches one determinization of a pegging position, encoded by
+        PeggingGame.State.to_bytes, and returns the (action, visits, average
+        payoff) table of the root edges.  This is run in worker processes
+        when determinizations are searched in parallel.
+    """
+    state = PeggingGame.State.from_bytes(data)
+    stats = mcts.SearchStats()
+    # pegging payoffs are point differences, not win/loss values
+    mcts.monte_carlo_tree_search(state, duration, stats, rng=mcts.search_rng(seed, decision, stream), normalize=True)
+    return stats.root_edges
+
+
+class MCTSPolicy:
+    """ A cribbage policy that chooses discards by estimating the expected
+        score of each split over sampled turn cards and opponent discards, and
+        pegs by searching sampled deals of the opponent's unseen cards
+        (determinizations) with MCTS and playing the card with the most visits
+        over all of them.  Pegging searches only the rest of the current hand,
+        so the game score is not taken into account.
+    """
+    def __init__(self, game, keep_time=0.1, peg_time=0.1, determinizations=4, workers=1, seed=19):
+        """ game -- a cribbage Game
+            keep_time -- the time in seconds to spend choosing discards
+            peg_time -- the time in seconds to spend choosing each play
+            determinizations -- the number of sampled deals searched per play
+            workers -- the number of processes to search determinizations in
+            seed -- the seed for sampling and searching
+        """
+        self._game = game
+        self._keep_time = keep_time
+        self._peg_time = peg_time
+        self._determinizations = determinizations
+        self._workers = workers
+        self._seed = seed
+        self._rng = random.Random(seed)
+        self._executor = None
+        self._decisions = 0
+        # the cards dealt for the current hand, which the opponent can't hold
+        self._dealt = []
+
+
+    def close(self):
+        """ Shuts down the worker processes, if any. """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+
+    def _unseen(self, known):
+        deck = self._game.deck()
+        deck.remove(known)
+        return deck.peek(deck.size())
+
+
+    def keep(self, hand, scores, am_dealer):
+        hand = list(hand)
+        self._dealt = hand
+        deadline = time() + self._keep_time
+        unseen = self._unseen(hand)
+        crib_sign = 1 if am_dealer else -1
+        splits = []
+        for indices in self._game.throw_indices():
+            keep = [c for i, c in enumerate(hand) if i not in indices]
+            throw = [c for i, c in enumerate(hand) if i in indices]
+            splits.append((keep, throw))
+
+        # every split is scored against the same sampled turn card and
+        # opponent discards in each round, which reduces the variance of the
+        # differences between them
+        totals = [0] * len(splits)
+        rounds = 0
+        while rounds == 0 or time() < deadline:
+            sample = self._rng.sample(unseen, 1 + self._game.throw_cards())
+            turn = sample[0]
+            others = sample[1:]
+            for i, (keep, throw) in enumerate(splits):
+                totals[i] += (self._game.hand_score(keep, turn, False)[0]
+                              + crib_sign * self._game.hand_score(throw + others, turn, True)[0])
+            rounds += 1
+
+        best = max(range(len(splits)), key=lambda i: totals[i])
+        return splits[best]
+
+
+    def _determinize(self, cards, history, player):
+        """ Returns a pegging state for the current position with the
+            opponent's cards sampled from those not yet seen.
+        """
+        opponent = 1 - player
+        played = [card for r in history.plays() for p, card in r if card is not None]
+        opponent_played = sum(1 for r in history.plays() for p, card in r if p == opponent and card is not None)
+        count = self._game.keep_cards() - opponent_played
+        unseen = self._unseen(self._dealt + played + list(cards))
+        hand = self._rng.sample(unseen, count)
+        if history.has_passed(opponent):
+            # the opponent said "go" so can't hold a card that fits
+            fits = lambda c: history.is_legal(self._game, c, opponent)
+            too_big = [c for c in unseen if not fits(c)]
+            if len(too_big) >= count:
+                hand = self._rng.sample(too_big, count)
+        hands = [None, None]
+        hands[player] = list(cards)
+        hands[opponent] = hand
+        state = PeggingGame.State(self._game, hands[0], hands[1], history)
+        state._turn = player
+        return state
+
+
+    def peg(self, cards, history, scores, am_dealer):
+        player = 0 if am_dealer else 1
+        legal = [c for c in cards if history.is_legal(self._game, c, player)]
+        if len(legal) == 0:
+            return None
+        if len(set(c.rank() for c in legal)) == 1:
+            # all plays are equivalent
+            return legal[0]
+
+        decision = self._decisions
+        self._decisions += 1
+        states = [self._determinize(cards, history, player) for i in range(self._determinizations)]
+        batches = -(-self._determinizations // self._workers)
+        duration = self._peg_time / batches
+        if self._workers > 1:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(self._workers)
+            futures = [self._executor.submit(search_determinization, state.to_bytes(), duration, self._seed, decision, i)
+                       for i, state in enumerate(states)]
+            tables = [future.result() for future in futures]
+        else:
+            tables = [search_determinization(state.to_bytes(), duration, self._seed, decision, i) for i, state in enumerate(states)]
+
+        visits = dict()
+        for table in tables:
+            for action, count, value in table:
+                visits[action] = visits.get(action, 0) + count
+        return max(legal, key=lambda c: visits.get(c, 0))
@@ -51,6 +51,40 @@ class State(ABC):
         pass
 
 
+    def get_canonical_actions(self):
+        """ Returns a list of actions in this nonterminal state that contains
+            one action from each set of actions that lead to equivalent
+            states, so that searches need only consider one of them.  The
+            default is all the actions returned by get_actions.
+
+            self -- a nonterminal state
+        """
+        return self.get_actions()
+
+
+    def action_key(self, action):
+        """ Returns a hashable key for the given action such that actions
+            that lead to equivalent states, of which get_canonical_actions
+            keeps only one, have the same key.  The default is the action
+            itself.
+
+            self -- a nonterminal state
+            action -- an action legal in this state
+        """
+        return action
+
+
+    def canonical_key(self):
+        """ Returns a hashable key for this state such that states with the
+            same key have the same actions, up to equivalence, and the same
+            payoffs from here to the end of the game, less their current
+            scores.  The default is the state itself.
+
+            self -- a state
+        """
+        return self
+
+
     def is_legal(self, action):
         """ Determines if the given action is legal in this state.
 
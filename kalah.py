@@ -1,6 +1,15 @@
+import struct
+
 from game import Game, State
 
 class Kalah(Game):
+    # boards shared by the states decoded in this process, keyed by
+    # (houses per side, starting seeds)
+    _boards = {}
+
+    # houses per side, starting seeds, turn, bytes per pit count
+    HEADER = struct.Struct("<HHBB")
+
     def __init__(self, p, s=4):
         ''' Creates a Kalah board with the given number of houses
             per side (plus two store pits) each containing the given.
@@ -48,6 +57,47 @@ class Kalah(Game):
             self.owner[i] = 0
             self.owner[p + 1 + i] = 1
 
+        # the outcome of sowing from each house with fewer seeds than it takes
+        # to go all the way around: moves[pit][extras] is (last pit, change in
+        # seeds left for each player), so sowing needs no arithmetic on
+        # indices; each complete time around adds one seed to every pit in
+        # the sequence, which is p more seeds left for each player
+        self.moves = [None] * self.size
+        for pit in range(self.size):
+            if self.owner[pit] is not None:
+                self.moves[pit] = tuple(self._sow(pit, extras) for extras in range(self.size - 1))
+
+
+    def _sow(self, pit, extras):
+        last = self.sequence[pit][(extras - 1) % (self.size - 1)]
+        left = [0, 0]
+        for i in self.sequence[pit][:extras]:
+            if self.owner[i] is not None:
+                left[self.owner[i]] += 1
+        return (last, tuple(left))
+
+
+    @staticmethod
+    def board(p, s=4):
+        ''' Returns the shared board with the given number of houses per side
+            and starting seeds, creating it the first time it is asked for in
+            this process.  Reusing boards avoids building their move tables
+            again and lets states decoded from bytes compare equal.
+
+            p -- a nonnegative integer
+            s -- a nonnegative integer
+        '''
+        key = (p, s)
+        board = Kalah._boards.get(key)
+        if board is None:
+            board = Kalah(p, s)
+            Kalah._boards[key] = board
+        return board
+
+
+    def _width(self):
+        return 1 if 2 * self.pits * self._start_seeds < 256 else 2
+
             
     def initial_state(self):
         ''' Creates the initial state for this board.
@@ -156,14 +206,8 @@ class Kalah(Game):
             # number of seeds sown
             sowing = self._seeds[pit];
             
-            # number of complete times around
-            timesAround = sowing // (self._board.size - 1)
-
-            # number of pits to sow into after complete
-            extras = sowing % (self._board.size - 1)
-
-            # pit ending in
-            last = self._board.sequence[pit][(extras - 1 + self._board.size - 1) % (self._board.size - 1)]
+            timesAround, extras = divmod(sowing, self._board.size - 1)
+            last, _ = self._board.moves[pit][extras]
 
             return (sowing, timesAround, extras, last)
 
@@ -177,25 +221,29 @@ class Kalah(Game):
             if (p < 0 or p >= self._board.size) or self._board.owner[p] != self._turn or self._seeds[p] <= 0:
                 raise ValueError('Illegal move: %d' % p)
 
-            succ = Kalah.State(self._board, self._seeds[:], self._turn)
-
-            sowing, timesAround, extras, last = self._moving(p)
-            
-            succ._seeds[p] = 0
+            board = self._board
+            sowing = self._seeds[p]
+            times_around, extras = divmod(sowing, board.size - 1)
+            last, left = board.moves[p][extras]
+            sequence = board.sequence[p]
+
+            # sow; the successor is built directly rather than by the constructor
+            # since the seeds left are known from the table and the hash is
+            # computed once the move is complete
+            succ = Kalah.State.__new__(Kalah.State)
+            succ._board = board
+            succ._turn = self._turn
+            seeds = succ._seeds = self._seeds[:]
+            seeds[p] = 0
+            if times_around > 0:
+                for pit in sequence:
+                    seeds[pit] += times_around
+            for pit in sequence[:extras]:
+                seeds[pit] += 1
+            succ._seeds_left = [self._seeds_left[0] + left[0] + times_around * board.pits,
+                                self._seeds_left[1] + left[1] + times_around * board.pits]
             succ._seeds_left[self._turn] -= sowing
 
-            for i in range(0, extras):
-                pit = succ._board.sequence[p][i]
-                succ._seeds[pit] += timesAround + 1
-                if succ._board.owner[pit] is not None:
-                    succ._seeds_left[succ._board.owner[pit]] += timesAround + 1
-            if timesAround > 0:
-                for i in range(extras, self._board.size - 1):
-                    pit = succ._board.sequence[p][i]
-                    succ._seeds[pit] += timesAround
-                    if succ._board.owner[pit] is not None:
-                        succ._seeds_left[succ._board.owner[pit]] += timesAround
-
             # capture opposite seeds if end in own empty pit and opposite is not empty
             if succ._seeds[last] == 1 and succ._board.opposite[last] is not None and succ._seeds[succ._board.opposite[last]] > 0 and succ._board.owner[last] == self._turn:
                 captured = succ._seeds[succ._board.opposite[last]]
@@ -280,6 +328,33 @@ class Kalah(Game):
             return '%r %r %r' % (self._seeds, self._seeds_left, self._turn)
 
         
+        def to_bytes(self):
+            ''' Returns a compact encoding of this state: the size of the board
+                and the turn followed by the seeds in every pit.
+            '''
+            board = self._board
+            width = board._width()
+            return (Kalah.HEADER.pack(board.pits, board._start_seeds, self._turn, width)
+                    + struct.pack("<%d%s" % (board.size, "B" if width == 1 else "H"), *self._seeds))
+
+
+        @staticmethod
+        def from_bytes(data, board=None):
+            ''' Returns the state encoded in the given bytes by to_bytes.
+
+                data -- a bytes-like object
+                board -- the board of the state, or None to use the shared board
+                         of the encoded size
+            '''
+            pits, start_seeds, turn, width = Kalah.HEADER.unpack_from(data, 0)
+            if board is None:
+                board = Kalah.board(pits, start_seeds)
+            elif board.pits != pits or board._start_seeds != start_seeds:
+                raise ValueError('state is for Kalah(%d, %d)' % (pits, start_seeds))
+            seeds = struct.unpack_from("<%d%s" % (board.size, "B" if width == 1 else "H"), data, Kalah.HEADER.size)
+            return Kalah.State(board, list(seeds), turn)
+
+        
         def _compute_hash(self):
             # faster hash computation; thanks to CF
             self.hash = hash(tuple(self._seeds)) * 2 + self._turn
@@ -1,17 +1,68 @@
 from game import State
-from time import time
+from time import time, perf_counter
 from deck import Card
-from typing import List, Deque, Tuple, Union
-from math import log, sqrt
+from typing import List, Deque, Tuple, Union, Callable
+from math import log, sqrt, ceil, tanh
 import random
 from collections import deque
 
+class SearchStats:
+    """ Statistics filled in by a single call to monte_carlo_tree_search. """
+    PHASES = ("traverse", "expand", "simulate", "backpropagate")
+
+    def __init__(self):
+        self.iterations = 0
+        self.elapsed = 0.0
+        # seconds spent in each phase of the search
+        self.phase_times = {phase: 0.0 for phase in SearchStats.PHASES}
+        # nodes added to the tree, including the root
+        self.nodes = 0
+        # nodes removed from the tree to stay within the node limit
+        self.evicted = 0
+        # nodes in the tree at the end of the search, or None if not known
+        self.resident = None
+        # number of edges on the longest path from the root
+        self.max_depth = 0
+        # (action, visits, average payoff) for each edge out of the root
+        self.root_edges = []
+        # the exact payoff of the root if the solver proved it, else None
+        self.solved = None
+
+    def time_phase(self, phase: str, seconds: float) -> None:
+        self.phase_times[phase] += seconds
+
+    def record_root(self, root: 'Node') -> None:
+        self.root_edges = [(edge.action, edge.visits, edge.child.average_payoff()) for edge in root.edges]
+        self.solved = root.proven
+        self.resident = getattr(root, "resident", None)
+
+    def as_dict(self) -> dict:
+        return {"iterations": self.iterations,
+                "elapsed": self.elapsed,
+                "phase_times": dict(self.phase_times),
+                "nodes": self.nodes,
+                "evicted": self.evicted,
+                "resident": self.resident,
+                "max_depth": self.max_depth,
+                "solved": self.solved,
+                "root_edges": [{"action": str(action), "visits": visits, "value": value}
+                               for action, visits, value in self.root_edges]}
+
+
 class Node:
     def __init__(self, state: State):
         self._state = state
         self._edges = [] 
+        # actions without a child yet; None until the node is first expanded
+        self._untried = None
         self._value = 0
         self._visits = 0
+        # all-moves-as-first statistics: action key -> [visits, value] over the
+        # iterations in which this node's actor played the action at any
+        # point after this node
+        self._amaf = {}
+        # the exact payoff of this node once the solver has proved it
+        self._proven = None
 
     @property
     def value(self) -> float:
@@ -28,66 +79,433 @@ class Node:
     @property
     def visits(self) -> int:
         return self._visits
+
+    @property
+    def proven(self) -> Union[float, None]:
+        return self._proven
     
-    def expand(self) -> Tuple[Union['Edge', None], 'Node']:
+    def is_expandable(self, widening: Tuple[float, float] = None) -> bool:
+        """
+            Determines if a child can be added to this node, which is the case
+            when it has never been expanded or has untried actions.  With
+            progressive widening (c, alpha) the number of children is also
+            limited to ceil(c * visits ** alpha).
+        """
+        if self._untried is None:
+            return True
+        if not self._untried:
+            return False
+        return widening is None or len(self._edges) < ceil(widening[0] * self._visits ** widening[1])
+
+    def expand(self, rng: random.Random = None) -> Tuple[Union['Edge', None], 'Node']:
         """
             A node is expandable if it is non-terminal and has been visited. 
             Confirmed that node is non-terminal in main loop.
-            Add all children nodes at once to avoid bias in exploration.
+            Add one child for a randomly chosen untried action so there is no
+            bias in exploration; only one of each set of equivalent actions
+            (see State.get_canonical_actions) is tried; successors of the other actions are not
+            computed until they are chosen.  The action is chosen using rng
+            (the global random module if None).
         """
-        possible_actions = self.state.get_actions()
-        children_nodes = [Node(self.state.successor(action)) for action in possible_actions]
-        self._edges = [Edge(action, child, self) for action, child in zip(possible_actions, children_nodes)]
-        random_edge = random.choice(self.edges)
-        return random_edge, random_edge.child
+        rng = random if rng is None else rng
+        if self._untried is None:
+            self._untried = list(self.state.get_canonical_actions())
+        i = rng.randrange(len(self._untried))
+        action = self._untried[i]
+        self._untried[i] = self._untried[-1]
+        self._untried.pop()
+        new_edge = Edge(action, Node(self.state.successor(action)), self)
+        self._edges.append(new_edge)
+        return new_edge, new_edge.child
     
-    def next_child_to_explore(self, state: State) -> 'Edge':
+    def amaf_payoff(self, action) -> Tuple[int, float]:
+        """
+            Returns the all-moves-as-first visits and average payoff of the
+            given action, shared with the actions equivalent to it (see
+            State.action_key).
+        """
+        visits, value = self._amaf.get(self.state.action_key(action), (0, 0))
+        return visits, (value / visits if visits > 0 else 0)
+
+    def next_child_to_explore(self, rave: float = None, exploration: float = sqrt(2),
+                              bounds: Tuple[float, float] = None,
+                              payoff_bounds: Tuple[float, float] = None) -> 'Edge':
+        """
+            Returns the edge maximizing the UCB value from the point of view
+            of the actor at this node.  With RAVE the average payoff of each
+            edge is blended with its all-moves-as-first average, with the
+            weight of the latter falling off as sqrt(rave / (3 * visits + rave)).
+            The exploration term is exploration * sqrt(log(t) / visits).  If
+            bounds is a (low, high) pair then average payoffs are mapped from
+            that range to [-1, 1] first, so the exploration constant means
+            the same for any range of payoffs.  Children proven by the solver
+            are only chosen if nothing else is left, and those proven to have
+            the worst payoff in payoff_bounds for the actor are chosen last.
+        """
+        sign = 1 if self.state.actor() == 0 else -1
+        t = sum(e.visits for e in self.edges)
+        worst = None
+        if payoff_bounds is not None:
+            worst = payoff_bounds[0] if sign == 1 else payoff_bounds[1]
         def ucb(edge: 'Edge') -> float:
+            if edge.child._proven is not None:
+                # nothing more to learn from a proven child, but if nothing
+                # else is left it is better to choose a good one
+                return float('-inf') if edge.child._proven == worst else -1e9 + sign * edge.child._proven
             if edge.visits == 0:
                 return float('inf')
-            t = sum(e.visits for e in self.edges)
-            return ((edge.child.value / edge.visits) if state.actor() == 0 else (- edge.child.value / edge.visits)) + sqrt(2 * log(t) / edge.visits)
-        return max(self.edges, key=ucb) if state.actor() == 0 else min(self.edges, key=ucb)
+            q = edge.child.value / edge.visits
+            if rave is not None:
+                amaf_visits, amaf_q = self.amaf_payoff(edge.action)
+                if amaf_visits > 0:
+                    beta = sqrt(rave / (3 * edge.visits + rave))
+                    q = (1 - beta) * q + beta * amaf_q
+            if bounds is not None:
+                q = (2 * q - bounds[0] - bounds[1]) / (bounds[1] - bounds[0])
+            return sign * q + exploration * sqrt(log(t) / edge.visits)
+        return max(self.edges, key=ucb)
     
-    def simulate(self) -> float:
+    def simulate(self, rng: random.Random = None, played: List[Tuple[int, object]] = None,
+                 depth: int = None, evaluate: Callable[[State], float] = None) -> float:
+        """
+            Plays random actions chosen using rng (the global random module if
+            None) until the end of the game and returns the payoff.  If played
+            is a list then an (actor, action key) pair is appended to it for
+            each action, with the key from State.action_key.  If depth is given then the rollout stops after that many
+            actions and the position reached is scored by evaluate instead.
+        """
+        rng = random if rng is None else rng
         state = self._state
         while not state.is_terminal():
+            if depth is not None:
+                if depth == 0:
+                    return evaluate(state)
+                depth -= 1
             possible_actions = state.get_actions()
-            random_action = random.choice(possible_actions)
+            random_action = rng.choice(possible_actions)
+            if played is not None:
+                played.append((state.actor(), state.action_key(random_action)))
             state = state.successor(random_action)
         return state.payoff()
     
+    def subtree_size(self) -> int:
+        """ Returns the number of nodes in the subtree rooted at this node. """
+        count = 0
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            count += 1
+            stack.extend(edge.child for edge in node._edges)
+        return count
+
     def average_payoff(self) -> float:
         return self._value / self._visits if self._visits > 0 else 0
     
-    def backpropagate(self, reward: float, edges_to_root: Deque['Edge']) -> None:
+    def prove(self, payoff_bounds: Tuple[float, float] = None) -> bool:
+        """
+            Marks this node as proven if its children decide its payoff: a
+            child proven to have the best payoff in payoff_bounds for the
+            actor, or every action expanded into a proven child.  Returns
+            true if this node is proven.
+        """
+        if self._proven is not None:
+            return True
+        maximize = self.state.actor() == 0
+        best = None
+        if payoff_bounds is not None:
+            best = payoff_bounds[1] if maximize else payoff_bounds[0]
+        values = []
+        for edge in self._edges:
+            value = edge.child._proven
+            if value is not None and value == best:
+                self._proven = value
+                return True
+            values.append(value)
+        if self._untried is None or self._untried or None in values:
+            return False
+        self._proven = max(values) if maximize else min(values)
+        return True
+
+    def backpropagate(self, reward: float, edges_to_root: Deque['Edge'], played: List[Tuple[int, object]] = None,
+                      solve: bool = False, payoff_bounds: Tuple[float, float] = None) -> None:
+        """
+            Adds the reward to the nodes from this one up to the root.  If played
+            lists the (actor, action key) pairs of the rollout from this node then the
+            all-moves-as-first statistics of the nodes are updated too.  With
+            solve, proofs are passed up from this node for as long as they
+            decide the payoffs of its ancestors.
+        """
         # Update visit count and reward for leaf node first
         self._visits += 1
         self._value += reward
+        seen = None if played is None else set(played)
+        proving = solve and self._proven is not None
         while edges_to_root:
             edge = edges_to_root.popleft()
             edge.update_visits()
             edge.parent._value += reward 
             edge.parent._visits += 1
+            if proving:
+                proving = edge.parent.prove(payoff_bounds)
+            if seen is not None:
+                actor = edge.parent.state.actor()
+                seen.add((actor, edge.parent.state.action_key(edge.action)))
+                amaf = edge.parent._amaf
+                for player, action in seen:
+                    if player == actor:
+                        entry = amaf.get(action)
+                        if entry is None:
+                            amaf[action] = [1, reward]
+                        else:
+                            entry[0] += 1
+                            entry[1] += reward
         return 
 
 
 class RootNode(Node):
-    def __init__(self, state: State):
+    # eviction removes nodes until the tree is down to this fraction of the
+    # node limit, so that the cost of finding what to remove is spread over
+    # many iterations
+    EVICTION_LEVEL = 0.75
+
+    def __init__(self, state: State, widening: Tuple[float, float] = None, rave: float = None,
+                 rollout_depth: int = None, evaluate: Callable[[State], float] = None,
+                 exploration: float = sqrt(2), normalize: bool = False,
+                 solve: bool = False, payoff_bounds: Tuple[float, float] = None,
+                 max_nodes: int = None, evict: bool = True):
         super().__init__(state)
+        self._widening = widening
+        self._rave = rave
+        self._rollout_depth = rollout_depth
+        self._evaluate = evaluate
+        self._exploration = exploration
+        self._normalize = normalize
+        self._solve = solve
+        self._payoff_bounds = payoff_bounds
+        self._max_nodes = max_nodes
+        self._evict = evict
+        # the number of nodes in the tree, or None if not known
+        self._resident = 1
+        # the smallest and largest rewards seen by this search
+        self._low = None
+        self._high = None
+
+    @classmethod
+    def adopt(cls, node: Node, widening: Tuple[float, float] = None, rave: float = None,
+              rollout_depth: int = None, evaluate: Callable[[State], float] = None,
+              exploration: float = sqrt(2), normalize: bool = False,
+              solve: bool = False, payoff_bounds: Tuple[float, float] = None,
+              max_nodes: int = None, evict: bool = True) -> 'RootNode':
+        """ Returns a root for the subtree below the given node, keeping the statistics gathered so far. """
+        root = cls(node.state, widening, rave, rollout_depth, evaluate, exploration, normalize, solve, payoff_bounds,
+                   max_nodes, evict)
+        root._edges = node._edges
+        root._untried = node._untried
+        root._value = node._value
+        root._visits = node._visits
+        root._amaf = node._amaf
+        root._proven = node._proven
+        for edge in root._edges:
+            edge._parent = root
+        # counting the nodes takes time, so only do it if there is a limit
+        root._resident = root.subtree_size() if max_nodes is not None else None
+        return root
+
+    @property
+    def resident(self) -> Union[int, None]:
+        return self._resident
+
+    def evict(self, target: int) -> int:
+        """
+            Removes the subtrees below the least-visited edges, other than
+            the edges out of this root, until at most target nodes are left
+            or nothing else can be removed.  The actions of removed edges are
+            returned to their parents' untried actions so they can be added
+            again later; the statistics of the remaining nodes are kept.
+            Returns the number of nodes removed.
+        """
+        edges = []
+        stack = [edge.child for edge in self._edges]
+        while stack:
+            node = stack.pop()
+            edges.extend(node._edges)
+            stack.extend(edge.child for edge in node._edges)
+        edges.sort(key=lambda edge: edge.visits)
+        detached = set()
+        for edge in edges:
+            if self._resident - len(detached) <= target:
+                break
+            if id(edge.parent) in detached:
+                # already removed with one of its ancestors
+                continue
+            edge.parent._edges.remove(edge)
+            edge.parent._untried.append(edge.action)
+            stack = [edge.child]
+            while stack:
+                node = stack.pop()
+                detached.add(id(node))
+                stack.extend(e.child for e in node._edges)
+        removed = len(detached)
+        self._resident -= removed
+        return removed
     
-    def traverse(self) -> Tuple[Deque['Edge'], Node]:
+    def traverse(self, first: 'Edge' = None) -> Tuple[Deque['Edge'], Node]:
         """
             Use UCB formula to guide tree traversal from root to leaf node
-            Only return a node if it's a leaf node or it's expandable
+            Only return a node if it's a leaf node, it's expandable, or it's proven
+            If first is an edge out of the root then the traversal starts with it
         """
         node = self
         edges_to_leaf_node = deque()
-        while node.edges:
-            edge = node.next_child_to_explore(self.state)
+        if first is not None:
+            edges_to_leaf_node.appendleft(first)
+            node = first.child
+        bounds = None
+        if self._normalize and self._low is not None and self._high > self._low:
+            bounds = (self._low, self._high)
+        while node.edges and not node.is_expandable(self._widening) and node._proven is None:
+            edge = node.next_child_to_explore(self._rave, self._exploration, bounds, self._payoff_bounds)
             edges_to_leaf_node.appendleft(edge)
             node = edge.child
         return edges_to_leaf_node, node
+
+    def iterate(self, rng: random.Random, stats: SearchStats, callback=None, first: 'Edge' = None) -> None:
+        """
+            Runs one traverse-expand-simulate-backpropagate iteration of the
+            search from this root, recording it in the given stats.  If first
+            is an edge out of the root then the iteration goes through it.
+        """
+        stats.iterations += 1
+        can_expand = True
+        if self._max_nodes is not None and self._resident >= self._max_nodes:
+            if self._evict:
+                stats.evicted += self.evict(int(self._max_nodes * RootNode.EVICTION_LEVEL))
+            can_expand = self._resident < self._max_nodes
+        # Traverse: Choose path from root to best leaf node
+        phase_start = perf_counter()
+        edges_to_leaf_node, node_to_simulate_play = self.traverse(first)
+        phase_end = perf_counter()
+        stats.time_phase("traverse", phase_end - phase_start)
+        if callback is not None:
+            callback("traverse", phase_end - phase_start, stats)
+        # Expand: Add children to best leaf node if possible; a child of the
+        # root added by expand_all is simulated from before it is expanded.
+        # The root may always add children, whatever the node limit, since
+        # it needs them to choose an action
+        if ((can_expand or node_to_simulate_play is self) and (node_to_simulate_play is self or node_to_simulate_play._visits > 0)
+                and node_to_simulate_play._proven is None and not node_to_simulate_play.state.is_terminal()):
+            phase_start = perf_counter()
+            new_edge, node_to_simulate_play = node_to_simulate_play.expand(rng)
+            # Expand path to leaf node
+            edges_to_leaf_node.appendleft(new_edge)
+            phase_end = perf_counter()
+            stats.nodes += 1
+            if self._resident is not None:
+                self._resident += 1
+            stats.time_phase("expand", phase_end - phase_start)
+            if callback is not None:
+                callback("expand", phase_end - phase_start, stats)
+        stats.max_depth = max(stats.max_depth, len(edges_to_leaf_node))
+        if self._solve and node_to_simulate_play._proven is None and node_to_simulate_play.state.is_terminal():
+            node_to_simulate_play._proven = node_to_simulate_play.state.payoff()
+        played = [] if self._rave is not None else None
+        if node_to_simulate_play._proven is not None:
+            # no need to simulate from a proven node
+            reward = node_to_simulate_play._proven
+        else:
+            # Simulate: Simulate a random game from best leaf node to terminal state
+            phase_start = perf_counter()
+            reward = node_to_simulate_play.simulate(rng, played, self._rollout_depth, self._evaluate)
+            phase_end = perf_counter()
+            stats.time_phase("simulate", phase_end - phase_start)
+            if callback is not None:
+                callback("simulate", phase_end - phase_start, stats)
+        if self._low is None or reward < self._low:
+            self._low = reward
+        if self._high is None or reward > self._high:
+            self._high = reward
+        # Backpropagate: Update value of nodes in path from root to best leaf node
+        phase_start = perf_counter()
+        node_to_simulate_play.backpropagate(reward, edges_to_leaf_node, played, self._solve, self._payoff_bounds)
+        phase_end = perf_counter()
+        stats.time_phase("backpropagate", phase_end - phase_start)
+        if callback is not None:
+            callback("backpropagate", phase_end - phase_start, stats)
+
+    def expand_all(self, rng: random.Random, stats: SearchStats) -> None:
+        """
+            Adds a child of this root for every action that doesn't have one
+            yet.  Like the other children of the root these are added even if
+            the tree is at its node limit, and are never evicted.
+        """
+        while self._untried is None or self._untried:
+            self.expand(rng)
+            stats.nodes += 1
+            if self._resident is not None:
+                self._resident += 1
+
+    def sequential_halving(self, duration: float, rng: random.Random, stats: SearchStats, callback=None,
+                           gumbel: int = None) -> object:
+        """
+            Returns the action chosen by sequential halving over the actions
+            at this root, searching for the given number of seconds.  The
+            time is split evenly into ceil(log2(candidates)) rounds; in each
+            round iterations are sent through the remaining candidates in
+            turn, with UCT below them, and at the end of the round the better
+            half of the candidates by average payoff is kept.  With gumbel,
+            that many candidates are first sampled using Gumbel noise, which
+            also breaks near ties when ranking them (Gumbel sequential
+            halving with a uniform prior).
+        """
+        start_time = time()
+        self.expand_all(rng, stats)
+        sign = 1 if self.state.actor() == 0 else -1
+        candidates = list(self._edges)
+        noise = {}
+        if gumbel is not None:
+            noise = {edge: -log(-log(rng.random() or 1e-300)) for edge in candidates}
+            candidates = sorted(candidates, key=lambda edge: noise[edge], reverse=True)[:gumbel]
+        rounds = max(1, ceil(log(len(candidates), 2)))
+        for r in range(rounds):
+            if len(candidates) == 1:
+                break
+            end = start_time + duration * (r + 1) / rounds
+            i = 0
+            while i < len(candidates) or time() < end:
+                self.iterate(rng, stats, callback, candidates[i % len(candidates)])
+                i += 1
+            low = self._low if self._low is not None else 0
+            high = self._high if self._high is not None else 0
+            max_visits = max(edge.visits for edge in candidates)
+            def score(edge: 'Edge') -> float:
+                q = edge.child._proven if edge.child._proven is not None else edge.child.average_payoff()
+                if gumbel is None:
+                    return sign * q
+                # as in Gumbel MuZero, the weight on the payoff grows with the
+                # visits so the noise only matters when visits are scarce
+                scaled = (sign * q - (low if sign == 1 else -high)) / (high - low) if high > low else 0.5
+                return noise[edge] + (50 + max_visits) * scaled
+            candidates = sorted(candidates, key=score, reverse=True)[:ceil(len(candidates) / 2)]
+        return candidates[0].action
+
+    def best_action(self):
+        """
+            Returns the action of the root edge with the best payoff for the
+            actor: the exact payoff of children proven by the solver and the
+            average payoff of the others, preferring proven children on ties.
+            If the root is proven then the action is one that achieves its
+            proven payoff.
+        """
+        if self._proven is not None:
+            for edge in self.edges:
+                if edge.child._proven == self._proven:
+                    return edge.action
+        sign = 1 if self.state.actor() == 0 else -1
+        def payoff(edge: 'Edge') -> Tuple[float, bool]:
+            if edge.child._proven is not None:
+                return sign * edge.child._proven, True
+            return sign * edge.child.average_payoff(), False
+        return max(self.edges, key=payoff).action
     
 class Edge:
     def __init__(self, action: Union[Card, List[int]], child: Node, parent: Node):
@@ -116,24 +534,232 @@ class Edge:
         self._visits += 1
 
 
-def monte_carlo_tree_search(state: State, duration: float):
-    random.seed(19)
+def search_rng(seed: int, move: int, stream: int = 0) -> random.Random:
+    """
+        Returns a random number generator for one search.  Generators for
+        different moves or different streams (for example, parallel workers
+        searching the same move) are independent, and the same arguments
+        always give the same sequence.
+    """
+    return random.Random("%d:%d:%d" % (seed, move, stream))
+
+
+def leaf_evaluator(heuristic, scale: float = None) -> Callable[[State], float]:
+    """
+        Returns a function that estimates the payoff of a nonterminal state
+        using the given heuristic, which is either a function of a state or an
+        object with an evaluate method such as minimax.Heuristic.  With a scale
+        the heuristic value h is mapped to tanh(h / scale) to fit win/loss
+        payoffs in [-1, 1]; without one it is used as is.
+    """
+    h = heuristic.evaluate if hasattr(heuristic, "evaluate") else heuristic
+    if scale is None:
+        return h
+    return lambda state: tanh(h(state) / scale)
+
+
+def monte_carlo_tree_search(state: State, duration: float, stats: SearchStats = None, callback=None, rng: random.Random = None,
+                            widening: Tuple[float, float] = None, rave: float = None,
+                            rollout_depth: int = None, heuristic=None, heuristic_scale: float = None,
+                            exploration: float = sqrt(2), normalize: bool = False,
+                            solve: bool = False, payoff_bounds: Tuple[float, float] = None,
+                            max_nodes: int = None, evict: bool = True,
+                            halving: bool = False, gumbel: int = None,
+                            extra_time: Callable[['RootNode', float], float] = None):
+    """
+        Returns the action chosen by searching from the given state for the
+        given number of seconds.
+
+        stats -- a SearchStats to fill in, or None
+        callback -- a function called after each phase of each iteration
+                    with the name of the phase, the seconds spent in it, and
+                    the stats, or None
+        rng -- the random number generator for the search, or None for one
+               with a fixed seed; the global generator is never used
+        widening -- a (c, alpha) pair to limit each node to
+                    ceil(c * visits ** alpha) children, or None to add a
+                    child for every action as soon as the others are visited
+        rave -- the RAVE equivalence parameter (the number of visits at which
+                an edge's own average and its all-moves-as-first average get
+                roughly equal weight), or None to use plain UCT
+        rollout_depth -- the maximum number of random actions per rollout, or
+                         None to play rollouts to the end of the game
+        heuristic -- a heuristic (as for leaf_evaluator) that scores the
+                     positions where truncated rollouts stop; required with
+                     rollout_depth, and implies a depth of 0 without it
+        heuristic_scale -- the scale for leaf_evaluator, or None
+        exploration -- the UCB exploration constant
+        normalize -- true to map average payoffs to [-1, 1] using the
+                     smallest and largest payoffs seen so far in the search
+                     before applying the UCB formula, for games whose
+                     payoffs are not win/loss values in [-1, 1]
+        solve -- true to prove the exact payoffs of nodes whose children
+                 decide them (MCTS-Solver), skip proven subtrees, and return
+                 as soon as the root is proven
+        payoff_bounds -- the (smallest, largest) possible payoffs, so that
+                         a single child with the best payoff proves its
+                         parent, or None to wait for every child to be proven
+        max_nodes -- the most nodes the tree may hold, or None for no limit;
+                     the root and its children are kept even if there are
+                     more of them than that
+        evict -- true to make room when the tree is full by removing the
+                 subtrees below the least-visited edges, false to stop
+                 adding nodes and keep updating the existing ones
+        halving -- true to choose among the actions at the root by
+                   sequential halving (see RootNode.sequential_halving)
+                   instead of running UCT from the root until time is up
+        gumbel -- the number of root actions to sample with Gumbel noise for
+                  sequential halving, or None to use them all without noise;
+                  implies halving
+        extra_time -- a function called with the root and the seconds spent
+                      so far when the time is up, returning how many more
+                      seconds to search (0 or less to stop), or None; not
+                      used with sequential halving
+    """
+    if heuristic is not None and rollout_depth is None:
+        rollout_depth = 0
+    if rollout_depth is not None and heuristic is None:
+        raise ValueError("truncated rollouts need a heuristic")
+    evaluate = leaf_evaluator(heuristic, heuristic_scale) if heuristic is not None else None
+    if rng is None:
+        rng = search_rng(19, 0)
+    if max_nodes is not None and max_nodes < 1:
+        raise ValueError("the node limit must be positive")
+    if gumbel is not None and gumbel < 1:
+        raise ValueError("the number of Gumbel samples must be positive")
+    if stats is None:
+        stats = SearchStats()
     start_time = time()
-    root = RootNode(state)
-    while (time() - start_time) < duration:
-        # Traverse: Choose path from root to best leaf node
-        edges_to_leaf_node, node_to_simulate_play = root.traverse()
-        # Expand: Add children to best leaf node if possible
-        if not node_to_simulate_play.state.is_terminal():
-            new_edge, node_to_simulate_play = node_to_simulate_play.expand()
-            # Expand path to leaf node
-            edges_to_leaf_node.appendleft(new_edge)
-        # Simulate: Simulate a random game from best leaf node to terminal state
-        reward = node_to_simulate_play.simulate()
-        # Backpropagate: Update value of nodes in path from root to best leaf node
-        node_to_simulate_play.backpropagate(reward, edges_to_leaf_node)
+    root = RootNode(state, widening, rave, rollout_depth, evaluate, exploration, normalize, solve, payoff_bounds,
+                    max_nodes, evict)
+    stats.nodes += 1
+    if halving or gumbel is not None:
+        action = root.sequential_halving(duration, rng, stats, callback, gumbel)
+        stats.elapsed = time() - start_time
+        stats.record_root(root)
+        return action
+    while (time() - start_time) < duration and root._proven is None:
+        root.iterate(rng, stats, callback)
+        if extra_time is not None and (time() - start_time) >= duration and root._proven is None:
+            duration = time() - start_time + max(0, extra_time(root, time() - start_time))
+    stats.elapsed = time() - start_time
+    stats.record_root(root)
     
-    return max(root.edges, key=lambda edge: edge.child.average_payoff()).action if root.state.actor() == 0 else min(root.edges, key=lambda edge: edge.child.average_payoff()).action
+    return root.best_action()
+
+def mcts_policy(duration: float, seed: int = 19, **options):
+    """
+        Returns a policy that searches for the given time per move.  The
+        statistics of the most recent search are available as the policy's
+        stats attribute.  Each search uses its own random number generator
+        seeded from the given seed and the number of moves made so far.
+        Other keyword arguments are passed to monte_carlo_tree_search.
+    """
+    def fxn(state: State):
+        fxn.stats = SearchStats()
+        rng = search_rng(seed, fxn.moves)
+        fxn.moves += 1
+        return monte_carlo_tree_search(state, duration, fxn.stats, rng=rng, **options)
+    fxn.stats = None
+    fxn.moves = 0
+    return fxn
+
+
+class TimeManager:
+    """
+        Divides a game clock among the moves of one player.  Each move is
+        allotted an equal share of the time left over the expected number of
+        moves to come, plus the increment, and the search may be extended
+        when the root's statistics disagree about the best action, but never
+        beyond a few times the allotment, a fraction of the time left on the
+        clock, or the hard ceiling per move.
+    """
+    def __init__(self, total: float, increment: float = 0.0, ceiling: float = None, moves: int = 20,
+                 disagreement: float = 0.5, extension: float = 1.0, stretch: float = 2.5, share: float = 0.25):
+        """
+            total -- the seconds on the clock at the start of the game
+            increment -- the seconds added to the clock after each move
+            ceiling -- the most seconds to spend on any move, or None for no
+                       limit other than the clock
+            moves -- the number of moves the time left is expected to cover
+            disagreement -- the fraction of the most-visited action's visits
+                            above which a second action makes the position
+                            critical
+            extension -- the fraction of a move's allotment to add each time
+                         the search is extended
+            stretch -- the most time to spend on any move, including
+                       extensions, as a multiple of its allotment
+            share -- the most time to spend on any move as a fraction of the
+                     time left on the clock
+        """
+        self.remaining = total
+        self._increment = increment
+        self._ceiling = ceiling
+        self._moves = moves
+        self._disagreement = disagreement
+        self._extension = extension
+        self._stretch = stretch
+        self._share = share
+
+    def allot(self) -> Tuple[float, float]:
+        """ Returns the time to search the next move and the hard limit on it. """
+        allotted = self.remaining / self._moves + self._increment
+        limit = max(0.0, min(self._stretch * allotted, self._share * self.remaining))
+        if self._ceiling is not None:
+            limit = min(limit, self._ceiling)
+        return min(limit, allotted), limit
+
+    def is_critical(self, root: RootNode) -> bool:
+        """
+            Determines if the search from the given root is undecided: the
+            most-visited action is not the one with the best average payoff,
+            or another action has almost as many visits.
+        """
+        if len(root.edges) < 2:
+            return False
+        edges = sorted(root.edges, key=lambda edge: edge.visits, reverse=True)
+        return (edges[0].action != root.best_action()
+                or edges[1].visits > self._disagreement * edges[0].visits)
+
+    def extra_time(self, root: RootNode, elapsed: float, allotted: float, limit: float) -> float:
+        """ Returns how much longer to search the given root, for monte_carlo_tree_search. """
+        if not self.is_critical(root):
+            return 0.0
+        return min(self._extension * allotted, limit - elapsed)
+
+    def charge(self, elapsed: float) -> None:
+        """ Takes the time spent on a move off the clock and adds the increment. """
+        self.remaining += self._increment - elapsed
+
 
-def mcts_policy(duration: float):
-    return lambda state: monte_carlo_tree_search(state, duration)
\ No newline at end of file
+def managed_policy(manager: TimeManager, seed: int = 19, **options):
+    """
+        Returns a policy that searches for the time allotted by the given
+        time manager, charging the time used to its clock.  Positions with
+        only one action (up to equivalence) are answered without searching.
+        The policy's stats, moves, and manager attributes are as for
+        mcts_policy, with stats for forced moves showing no iterations.
+        Other keyword arguments are passed to monte_carlo_tree_search.
+    """
+    def fxn(state: State):
+        start_time = time()
+        fxn.stats = SearchStats()
+        actions = state.get_canonical_actions()
+        if len(actions) == 1:
+            manager.charge(time() - start_time)
+            return actions[0]
+        rng = search_rng(seed, fxn.moves)
+        fxn.moves += 1
+        allotted, limit = manager.allot()
+        if allotted <= 0:
+            # out of time
+            manager.charge(time() - start_time)
+            return actions[0]
+        extend = lambda root, elapsed: manager.extra_time(root, elapsed, allotted, limit)
+        action = monte_carlo_tree_search(state, allotted, fxn.stats, rng=rng, extra_time=extend, **options)
+        manager.charge(time() - start_time)
+        return action
+    fxn.stats = None
+    fxn.moves = 0
+    fxn.manager = manager
+    return fxn
@@ -1,3 +1,5 @@
+from concurrent.futures import ProcessPoolExecutor
+
 from kalah import Kalah
 
 class Heuristic:
@@ -56,10 +58,43 @@ def seeds_stored_heuristic_soft_winner(pos):
     return pos._seeds_stored(0) - pos._seeds_stored(1)
 
 
-def minimax_policy(depth, h):
+def score_difference_heuristic(pos):
+    ''' A heuristic for pegging.  Returns the difference in points scored so
+        far (P1 - P2), which is the payoff if the position is terminal.
+
+        pos -- a pegging position
+    '''
+    score = pos.score()
+    return score[0] - score[1]
+
+
+def minimax_policy(depth, h, workers=1):
+    ''' Returns a policy that chooses moves by minimax search to the given
+        depth.  With more than one worker the moves from the root are
+        searched in parallel by parallel_minimax, which chooses the same
+        moves; the worker processes are started on the first move and the
+        policy's stop attribute shuts them down.
+
+        depth -- a positive integer
+        h -- a Heuristic; with workers its function must be picklable
+        workers -- the number of worker processes
+    '''
     def fxn(pos):
-        value, move = minimax(pos, depth, h)
+        if workers > 1:
+            if fxn.executor is None:
+                fxn.executor = ProcessPoolExecutor(workers)
+            value, move = parallel_minimax(pos, depth, h, fxn.executor, workers)
+        else:
+            value, move = minimax(pos, depth, h)
         return move
+    def stop():
+        if fxn.executor is not None:
+            fxn.executor.shutdown()
+            fxn.executor = None
+    # exposed so callers can count the positions evaluated by the search
+    fxn.heuristic = h
+    fxn.executor = None
+    fxn.stop = stop
     return fxn
 
 
@@ -78,7 +113,7 @@ def minimax(pos, depth, h):
             # max player
             best_value = -h.inf
             best_move = None
-            moves = pos.get_actions()
+            moves = pos.get_canonical_actions()
             for move in moves:
                 child = pos.successor(move)
                 mm, _ = minimax(child, depth - 1, h)
@@ -90,7 +125,7 @@ def minimax(pos, depth, h):
             # min player
             best_value = h.inf
             best_move = None
-            moves = pos.get_actions()
+            moves = pos.get_canonical_actions()
             for move in moves:
                 child = pos.successor(move)
                 mm, _ = minimax(child, depth - 1, h)
@@ -98,3 +133,85 @@ def minimax(pos, depth, h):
                     best_value = mm
                     best_move = move
             return (best_value, best_move)
+
+
+def alphabeta(pos, depth, alpha, beta, h):
+    ''' Returns the minimax value of the given position, as computed by
+        minimax, if it is strictly between alpha and beta.  Otherwise returns
+        a value no greater than alpha if the minimax value is no greater than
+        alpha, or no less than beta if the minimax value is no less than beta,
+        skipping moves that can't change the result.
+
+        pos -- a game position
+        depth -- a nonnegative integer
+        alpha, beta -- bounds with alpha < beta
+        h -- a heuristic function that can be applied to pos and all its successors
+    '''
+    if pos.is_terminal() or depth == 0:
+        return h.evaluate(pos)
+    elif pos.actor() == 0:
+        best_value = -h.inf
+        for move in pos.get_canonical_actions():
+            best_value = max(best_value, alphabeta(pos.successor(move), depth - 1, alpha, beta, h))
+            if best_value >= beta:
+                break
+            alpha = max(alpha, best_value)
+        return best_value
+    else:
+        best_value = h.inf
+        for move in pos.get_canonical_actions():
+            best_value = min(best_value, alphabeta(pos.successor(move), depth - 1, alpha, beta, h))
+            if best_value <= alpha:
+                break
+            beta = min(beta, best_value)
+        return best_value
+
+
+def search_move(args):
+    ''' Searches the position after one move from the root in a worker
+        process and returns its alphabeta value and the number of heuristic
+        calls made.
+
+        args -- a (state type, root encoded by to_bytes, move, depth of the
+                root, heuristic function, alpha, beta) tuple
+    '''
+    state_type, data, move, depth, heuristic, alpha, beta = args
+    h = Heuristic(heuristic)
+    pos = state_type.from_bytes(data)
+    return alphabeta(pos.successor(move), depth - 1, alpha, beta, h), h.calls
+
+
+def parallel_minimax(pos, depth, h, executor, workers):
+    ''' Returns the same (value, move) pair as minimax, searching the moves
+        from the given position in parallel.  The first move is searched
+        here to bound the value (young brothers wait), and the rest are
+        searched with alpha-beta in batches of one per worker, each batch
+        using the best value found so far as its bound.  A move that can't
+        do strictly better than that is never chosen, so ties are broken as
+        in minimax.  Heuristic calls made by the workers are added to h.
+
+        pos -- a game position that can be encoded with to_bytes
+        depth -- a nonnegative integer
+        h -- a Heuristic whose function is picklable
+        executor -- a process pool
+        workers -- the number of searches to run at once
+    '''
+    if pos.is_terminal() or depth == 0:
+        return (h.evaluate(pos), None)
+    maximize = pos.actor() == 0
+    moves = pos.get_canonical_actions()
+    best_move = moves[0]
+    best_value = alphabeta(pos.successor(best_move), depth - 1, -h.inf, h.inf, h)
+    data = pos.to_bytes()
+    for start in range(1, len(moves), workers):
+        batch = moves[start:start + workers]
+        alpha, beta = (best_value, h.inf) if maximize else (-h.inf, best_value)
+        futures = [executor.submit(search_move, (type(pos), data, move, depth, h.heuristic, alpha, beta))
+                   for move in batch]
+        for move, future in zip(batch, futures):
+            value, calls = future.result()
+            h.calls += calls
+            if (value > best_value) if maximize else (value < best_value):
+                best_value = value
+                best_move = move
+    return (best_value, best_move)
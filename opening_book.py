@@ -0,0 +1,238 @@
+import argparse
+import os
+import struct
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import mcts
+from kalah import Kalah
+
+
+class OpeningBookError(Exception):
+    pass
+
+
+class OpeningBook:
+    ''' The best moves and value estimates for Kalah positions near the start
+        of the game.  Books are saved as a header followed by fixed-size
+        records, each holding the position's encoding from
+        Kalah.State.to_bytes as the key and the move, value, and visits of
+        the best move.
+    '''
+    MAGIC = b"KBK2"
+    # magic, pits, start seeds, number of records
+    HEADER = struct.Struct("<4sHHI")
+    # move, value, visits
+    ENTRY = struct.Struct("<HfI")
+
+    def __init__(self, board):
+        ''' Creates an empty book for the given board.
+
+            board -- a Kalah board
+        '''
+        self._board = board
+        self._entries = dict()
+
+
+    def key(self, pos):
+        return pos.to_bytes()
+
+
+    def add(self, pos, move, value, visits):
+        ''' Records the best move from the given position.
+
+            pos -- a nonterminal position on this book's board
+            move -- a legal move from pos
+            value -- the estimated payoff to P1 of pos
+            visits -- the number of search iterations through the move
+        '''
+        self._entries[self.key(pos)] = (move, value, visits)
+
+
+    def lookup(self, pos):
+        ''' Returns the (move, value, visits) triple recorded for the given
+            position, or None if the position is not in this book.
+
+            pos -- a position on this book's board
+        '''
+        return self._entries.get(self.key(pos))
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+    def save(self, filename):
+        with open(filename, "wb") as f:
+            f.write(OpeningBook.HEADER.pack(OpeningBook.MAGIC, self._board.pits, self._board._start_seeds, len(self._entries)))
+            for key, (move, value, visits) in sorted(self._entries.items()):
+                f.write(key)
+                f.write(OpeningBook.ENTRY.pack(move, value, visits))
+
+
+    @staticmethod
+    def load(filename, board=None):
+        ''' Returns the book saved in the given file.
+
+            filename -- the name of a file written by save
+            board -- the Kalah board to use for the book, or None to create one
+        '''
+        with open(filename, "rb") as f:
+            data = f.read()
+        if len(data) < OpeningBook.HEADER.size:
+            raise OpeningBookError("truncated opening book " + filename)
+        magic, pits, start_seeds, count = OpeningBook.HEADER.unpack_from(data, 0)
+        if magic != OpeningBook.MAGIC:
+            raise OpeningBookError("not an opening book: " + filename)
+        if board is None:
+            board = Kalah(pits, start_seeds)
+        elif board.pits != pits or board._start_seeds != start_seeds:
+            raise OpeningBookError("opening book is for Kalah(%d, %d)" % (pits, start_seeds))
+        book = OpeningBook(board)
+        # every position on the board has an encoding of the same length
+        size = len(board.initial_state().to_bytes())
+        offset = OpeningBook.HEADER.size
+        if len(data) != offset + count * (size + OpeningBook.ENTRY.size):
+            raise OpeningBookError("truncated opening book " + filename)
+        for i in range(count):
+            key = data[offset:offset + size]
+            offset += size
+            book._entries[key] = OpeningBook.ENTRY.unpack_from(data, offset)
+            offset += OpeningBook.ENTRY.size
+        return book
+
+
+def early_positions(board, plies):
+    ''' Returns a list of the distinct nonterminal positions reachable from
+        the initial position of the given board in at most the given number
+        of moves, in order of distance from the start.
+
+        board -- a Kalah board
+        plies -- a nonnegative integer
+    '''
+    frontier = [board.initial_state()]
+    seen = set(frontier)
+    positions = list(frontier)
+    for ply in range(plies):
+        next_frontier = []
+        for pos in frontier:
+            for move in pos.get_actions():
+                succ = pos.successor(move)
+                if not succ.is_terminal() and succ not in seen:
+                    seen.add(succ)
+                    next_frontier.append(succ)
+        positions.extend(next_frontier)
+        frontier = next_frontier
+    return positions
+
+
+def search_position(data, duration, seed, index, stream):
+    ''' Searches the position encoded in the given bytes in a worker
+        process and returns the (move, visits, average payoff) table of the
+        root edges.
+    '''
+    pos = Kalah.State.from_bytes(data)
+    stats = mcts.SearchStats()
+    mcts.monte_carlo_tree_search(pos, duration, stats, rng=mcts.search_rng(seed, index, stream))
+    return stats.root_edges
+
+
+def merge_root_edges(tables):
+    ''' Combines the root edge tables of independent searches of the same
+        position, returning a dictionary mapping each move to its total
+        visits and visit-weighted average payoff.
+    '''
+    totals = dict()
+    for table in tables:
+        for move, visits, value in table:
+            old_visits, old_value = totals.get(move, (0, 0.0))
+            totals[move] = (old_visits + visits, old_value + visits * value)
+    return {move: (visits, total / visits if visits > 0 else 0.0) for move, (visits, total) in totals.items()}
+
+
+def build_book(board, plies, duration, workers, streams, seed=19, log=lambda mess: None):
+    ''' Returns a book for the positions within the given number of moves of
+        the start, each searched by the given number of independent MCTS
+        streams for the given time in a pool of worker processes.
+
+        board -- a Kalah board
+        plies -- a nonnegative integer
+        duration -- search time per stream per position, in seconds
+        workers -- the number of worker processes
+        streams -- the number of independent searches of each position
+        seed -- the seed for the searches
+        log -- a function that takes a progress message
+    '''
+    positions = early_positions(board, plies)
+    log("searching %d positions" % len(positions))
+    book = OpeningBook(board)
+    with ProcessPoolExecutor(workers) as executor:
+        futures = [[executor.submit(search_position, pos.to_bytes(), duration, seed, i, stream)
+                    for stream in range(streams)]
+                   for i, pos in enumerate(positions)]
+        for i, (pos, searches) in enumerate(zip(positions, futures)):
+            merged = merge_root_edges(search.result() for search in searches)
+            choose = max if pos.actor() == 0 else min
+            move = choose(merged, key=lambda m: merged[m][1])
+            visits, value = merged[move]
+            book.add(pos, move, value, visits)
+            if (i + 1) % 100 == 0:
+                log("%d/%d positions" % (i + 1, len(positions)))
+    return book
+
+
+def book_policy(book, fallback):
+    ''' Returns a policy that plays the book move for positions in the given
+        book and otherwise uses the fallback policy.  If the fallback has a
+        stats attribute then so does the policy, showing no iterations after
+        a book move, and if it has a stop attribute then so does the policy.
+
+        book -- an OpeningBook
+        fallback -- a function that takes a position and returns a move
+    '''
+    def fxn(pos):
+        entry = book.lookup(pos)
+        if entry is not None and pos.is_legal(entry[0]):
+            if hasattr(fallback, "stats"):
+                fxn.stats = mcts.SearchStats()
+            return entry[0]
+        move = fallback(pos)
+        if hasattr(fallback, "stats"):
+            fxn.stats = fallback.stats
+        return move
+    if hasattr(fallback, "stats"):
+        fxn.stats = fallback.stats
+    if hasattr(fallback, "stop"):
+        fxn.stop = fallback.stop
+    return fxn
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build a Kalah opening book with offline MCTS")
+    parser.add_argument('output', help='file to write the book to')
+    parser.add_argument('--pits', dest='pits', type=int, action='store', default=6, help='houses per side (default=6)')
+    parser.add_argument('--seeds', dest='seeds', type=int, action='store', default=4, help='starting seeds per house (default=4)')
+    parser.add_argument('--plies', dest='plies', type=int, action='store', default=3, help='depth of positions to include (default=3)')
+    parser.add_argument('--time', dest='time', type=float, action='store', default=2.0, help='search time per stream per position (default=2.0)')
+    parser.add_argument('--workers', dest='workers', type=int, action='store', default=os.cpu_count(), help='worker processes (default=number of CPUs)')
+    parser.add_argument('--streams', dest='streams', type=int, action='store', default=4, help='independent searches per position (default=4)')
+    parser.add_argument('--seed', dest='seed', type=int, action='store', default=19, help='seed for the searches (default=19)')
+    args = parser.parse_args()
+
+    try:
+        if args.pits < 1 or args.seeds < 1:
+            raise OpeningBookError("pits and seeds must be positive")
+        if args.plies < 0:
+            raise OpeningBookError("plies must be nonnegative")
+        if args.time <= 0:
+            raise OpeningBookError("time must be positive")
+        if args.workers is None or args.workers < 1 or args.streams < 1:
+            raise OpeningBookError("workers and streams must be positive")
+
+        book = build_book(Kalah(args.pits, args.seeds), args.plies, args.time, args.workers, args.streams, args.seed, print)
+        book.save(args.output)
+        print("wrote %d positions to %s" % (len(book), args.output))
+        sys.exit(0)
+    except (OpeningBookError, OSError) as err:
+        print(sys.argv[0] + ":", str(err))
+        sys.exit(1)
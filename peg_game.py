@@ -1,9 +1,17 @@
+import struct
+
 from game import Game, State
 import cribbage
-from pegging import Pegging
+from pegging import Pegging, card_code, code_card
 
 
 class PeggingGame(Game):
+    # the cribbage game shared by the states decoded in this process
+    _shared_game = None
+
+    # P0 score, P1 score, turn, cards in P0's hand, cards in P1's hand
+    HEADER = struct.Struct("<hhBBB")
+
     def __init__(self, cards):
         """ Creates a cribbage pegging game where each player is dealt the
             given number of cards.
@@ -14,6 +22,16 @@ class PeggingGame(Game):
         self._game = cribbage.Game()
 
 
+    @staticmethod
+    def shared_game():
+        """ Returns the cribbage game shared by states decoded in this
+            process, creating it the first time it is asked for.
+        """
+        if PeggingGame._shared_game is None:
+            PeggingGame._shared_game = cribbage.Game()
+        return PeggingGame._shared_game
+
+
     def initial_state(self):
         deck = self._game.deck();
         deck.shuffle()
@@ -71,7 +89,33 @@ class PeggingGame(Game):
             else:
                 return cards
 
-            
+
+        def get_canonical_actions(self):
+            # the score of a play depends only on the card's rank, so cards of
+            # the same rank are interchangeable; keep the first of each
+            ranks = set()
+            cards = []
+            for c in self._cards[self._turn]:
+                if c.rank() not in ranks and self._history.is_legal(self._game, c, self._turn):
+                    ranks.add(c.rank())
+                    cards.append(c)
+            if len(cards) == 0:
+                return [None]
+            else:
+                return cards
+
+
+        def action_key(self, card):
+            return None if card is None else card.rank()
+
+
+        def canonical_key(self):
+            return (tuple(sorted(c.rank() for c in self._cards[0])),
+                    tuple(sorted(c.rank() for c in self._cards[1])),
+                    self._history.round_key(),
+                    self._turn)
+
+
         def is_legal(self, card):
             if card is None:
                 return not self._history.has_legal_play(self._game, self._cards[self._turn], self._turn)
@@ -79,6 +123,36 @@ class PeggingGame(Game):
                 return self._history.is_legal(self._game, card, self._turn)
 
 
+        def to_bytes(self):
+            """ Returns a compact encoding of this state: the scores, the turn,
+                and the hand sizes, then a byte per card in each hand, then
+                the pegging history as encoded by Pegging.to_bytes.
+            """
+            return (PeggingGame.HEADER.pack(self._score[0], self._score[1], self._turn,
+                                            len(self._cards[0]), len(self._cards[1]))
+                    + bytes(card_code(self._game, c) for hand in self._cards for c in hand)
+                    + self._history.to_bytes(self._game))
+
+
+        @staticmethod
+        def from_bytes(data, game=None):
+            """ Returns the state encoded in the given bytes by to_bytes.
+
+                data -- a bytes-like object
+                game -- the cribbage game of the state, or None for the shared one
+            """
+            if game is None:
+                game = PeggingGame.shared_game()
+            score0, score1, turn, count0, count1 = PeggingGame.HEADER.unpack_from(data, 0)
+            start = PeggingGame.HEADER.size
+            cards = [code_card(game, c) for c in data[start:start + count0 + count1]]
+            history = Pegging.from_bytes(data[start + count0 + count1:], game)
+            state = PeggingGame.State(game, cards[:count0], cards[count0:], history)
+            state._score = [score0, score1]
+            state._turn = turn
+            return state
+
+
         def successor(self, action):
             # update cards available
             remaining = self._cards[:]
@@ -1,3 +1,6 @@
+from deck import Card
+
+
 class Pegging:
     """ The history of cards played during the pegging phase of a hand. """
 
@@ -61,6 +64,21 @@ class Pegging:
         return self._total
 
 
+    def round_key(self):
+        """ Returns a hashable key for the current round of pegging in this
+            history: the ranks of the cards played in the round in order,
+            the total, and which players have passed.  Histories with the
+            same key score every future play the same.
+        """
+        ranks = []
+        curr = self
+        while curr is not None:
+            if curr._card is not None:
+                ranks.append(curr._card.rank())
+            curr = curr._prev_play
+        return (tuple(reversed(ranks)), self._total, tuple(self._passed))
+
+
     def has_passed(self, player):
         """ Determines if this given player has passed in the current
             round of pegging in this history.
@@ -178,6 +196,45 @@ class Pegging:
         return pair_score + straight_score + fifteen_score + thirtyone_score
 
 
+    def events(self):
+        """ Returns the list of (player, card) pairs played to reach this
+            history, in order, with None for the card when a player passes.
+        """
+        events = []
+        curr = self
+        while curr is not None and curr._player is not None:
+            events.append((curr._player, curr._card))
+            curr = curr._prev_play if curr._prev_play is not None else curr._prev_round
+        events.reverse()
+        return events
+
+
+    def to_bytes(self, game):
+        """ Returns a compact encoding of this history: one byte per play
+            holding the player in the high bit and, in the rest, 0 for a
+            pass or one more than the card's code from card_code.
+
+            game -- a cribbage game
+        """
+        return bytes((player << 7) | (0 if card is None else card_code(game, card) + 1)
+                     for player, card in self.events())
+
+
+    @staticmethod
+    def from_bytes(data, game):
+        """ Returns the history encoded in the given bytes by to_bytes,
+            rebuilt by replaying its plays.
+
+            data -- a bytes-like object
+            game -- a cribbage game
+        """
+        history = Pegging()
+        for b in data:
+            card = None if b & 0x7f == 0 else code_card(game, (b & 0x7f) - 1)
+            history, _ = history.play(game, card, b >> 7)
+        return history
+
+
     def plays(self):
         history = []
         curr_round = []
@@ -245,3 +302,22 @@ class Pegging:
             sep = "," if len(start) > 0 and start[-1] != " " else ""
             return "".join([start, sep, str(self._player), ":", str(self._card), end])
         
+
+
+def card_code(game, card):
+    """ Returns a code from 0 to 51 for the given card, from its rank and the
+        position of its suit in game.all_suits().
+
+        game -- a cribbage game
+        card -- a card
+    """
+    return (card.rank() - 1) * 4 + game.all_suits().index(card.suit())
+
+
+def code_card(game, code):
+    """ Returns the card with the given code from card_code.
+
+        game -- a cribbage game
+        code -- an integer from 0 to 51
+    """
+    return Card(code // 4 + 1, game.all_suits()[code % 4])
@@ -0,0 +1,88 @@
+from collections import OrderedDict
+
+
+class PeggingSolver:
+    """ An exact solver for pegging positions.  The points still to be
+        scored from a position under best play depend only on the ranks left
+        in each hand, the current round of pegging, and whose turn it is, so
+        they are memoized by the position's canonical key and reused for any
+        position with the same key, in the same hand or in later ones.  Keys
+        don't include the cards' suits, the earlier rounds, or the score.
+    """
+    def __init__(self, maxsize=1000000):
+        """ maxsize -- the maximum number of positions to remember """
+        self._maxsize = maxsize
+        self._values = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+    def _future(self, pos):
+        # the net points P0 scores from pos to the end of the hand
+        if pos.is_terminal():
+            return 0
+        key = pos.canonical_key()
+        result = self._values.get(key)
+        if result is not None:
+            self.hits += 1
+            self._values.move_to_end(key)
+            return result
+        self.misses += 1
+        result, _ = self._search(pos)
+        self._values[key] = result
+        if len(self._values) > self._maxsize:
+            self._values.popitem(last=False)
+        return result
+
+
+    def _search(self, pos):
+        # the best net future points and the first action that gets them
+        maximize = pos.actor() == 0
+        best_value = None
+        best_action = None
+        for action in pos.get_canonical_actions():
+            succ = pos.successor(action)
+            value = succ.payoff() - pos.payoff() + self._future(succ)
+            if best_value is None or (value > best_value if maximize else value < best_value):
+                best_value = value
+                best_action = action
+        return best_value, best_action
+
+
+    def value(self, pos):
+        """ Returns the payoff to P0 at the end of the hand when both players
+            play the rest of it as well as possible.
+
+            pos -- a pegging position
+        """
+        return pos.payoff() + self._future(pos)
+
+
+    def best_action(self, pos):
+        """ Returns an action that is best for the player to move, the same
+            one minimax would choose with a depth that reaches the end of the
+            hand.
+
+            pos -- a nonterminal pegging position
+        """
+        return self._search(pos)[1]
+
+
+    def __len__(self):
+        return len(self._values)
+
+
+    def hit_rate(self):
+        """ Returns the fraction of lookups answered from memory. """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+
+def solver_policy(solver=None):
+    """ Returns a policy that plays the pegging moves chosen by the given
+        solver, or by a new one.  The solver is the policy's solver attribute.
+    """
+    def fxn(pos):
+        return fxn.solver.best_action(pos)
+    fxn.solver = PeggingSolver() if solver is None else solver
+    return fxn
@@ -0,0 +1,172 @@
+import random
+import threading
+from collections import deque
+from time import sleep, time
+from typing import Tuple
+
+import mcts
+from game import State
+
+
+class PonderingSearch:
+    """
+        A long-lived MCTS search that keeps iterating in a background thread,
+        including while the opponent is thinking.  When the game moves on the
+        search is re-rooted at the matching node of its tree so the work done
+        so far is kept.
+    """
+    def __init__(self, rng: random.Random = None, widening: Tuple[float, float] = None, rave: float = None, reroot_depth: int = 4,
+                 max_nodes: int = None):
+        """
+            rng -- the random number generator for the search, or None for one with a fixed seed
+            widening, rave -- as for monte_carlo_tree_search
+            reroot_depth -- how many plies below the current root to look for the new position
+            max_nodes -- the most nodes the tree may hold, or None for no limit;
+                         the least-visited subtrees are removed to stay within
+                         it, but the root and its children are always kept
+        """
+        self._rng = mcts.search_rng(19, 0) if rng is None else rng
+        self._widening = widening
+        self._rave = rave
+        self._reroot_depth = reroot_depth
+        self._max_nodes = max_nodes
+        self._lock = threading.Lock()
+        # number of callers waiting for the lock; the background thread
+        # backs off while there are any so that queries are answered promptly
+        self._waiting = 0
+        # time at which the background thread pauses until the root next moves
+        self._pause_at = float("inf")
+        self._stopping = threading.Event()
+        self._thread = None
+        self._root = None
+        self._stats = mcts.SearchStats()
+
+    def _acquire(self):
+        self._waiting += 1
+        self._lock.acquire()
+        self._waiting -= 1
+
+    def _find(self, state: State) -> mcts.Node:
+        """ Returns the node for the given state within reroot_depth plies of the root, or None. """
+        frontier = deque([(self._root, 0)])
+        while frontier:
+            node, depth = frontier.popleft()
+            if node.state == state:
+                return node
+            if depth < self._reroot_depth:
+                frontier.extend((edge.child, depth + 1) for edge in node.edges)
+        return None
+
+    def advance(self, state: State) -> None:
+        """
+            Moves the root of the search to the given state, reusing the
+            matching subtree if the state has been reached in the tree.
+        """
+        self._acquire()
+        try:
+            node = self._find(state) if self._root is not None else None
+            if node is None:
+                self._root = mcts.RootNode(state, self._widening, self._rave, max_nodes=self._max_nodes)
+            elif node is not self._root:
+                self._root = mcts.RootNode.adopt(node, self._widening, self._rave, max_nodes=self._max_nodes)
+            else:
+                return
+            self._stats = mcts.SearchStats()
+        finally:
+            self._pause_at = float("inf")
+            self._lock.release()
+
+    def start(self, state: State = None) -> None:
+        """
+            Starts searching in the background, first moving the root to the
+            given state if there is one.  Does nothing else if already running.
+        """
+        if state is not None:
+            self.advance(state)
+        if self._root is None:
+            raise ValueError("no position to search")
+        if not self.is_running():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """ Stops the background search, keeping the tree. """
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join()
+            self._thread = None
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            if self._waiting > 0 or time() >= self._pause_at:
+                sleep(0.0001)
+                continue
+            with self._lock:
+                if self._root.state.is_terminal():
+                    break
+                self._root.iterate(self._rng, self._stats)
+
+    def think(self, duration: float) -> None:
+        """
+            Waits while the background search runs for the given number of
+            seconds, after which it pauses until the root next moves so that
+            the answer can be collected without waiting for the thread.
+        """
+        self._pause_at = time() + duration
+        if duration > 0:
+            sleep(duration)
+
+    def best_action(self):
+        """
+            Returns the best action found so far from the current root.  If no
+            action has been tried yet then iterations are run until one has.
+        """
+        self._acquire()
+        try:
+            while not self._root.edges:
+                self._root.iterate(self._rng, self._stats)
+            return self._root.best_action()
+        finally:
+            self._lock.release()
+
+    def stats(self) -> mcts.SearchStats:
+        """
+            Returns the statistics of the search since the root last moved;
+            nodes counts the nodes added in that time.
+        """
+        self._acquire()
+        try:
+            self._stats.record_root(self._root)
+            return self._stats
+        finally:
+            self._lock.release()
+
+
+def pondering_policy(duration: float, seed: int = 19, widening: Tuple[float, float] = None, rave: float = None,
+                     max_nodes: int = None):
+    """
+        Returns a policy that thinks for the given time (which may be 0) on
+        top of whatever it found while the opponent was moving, then keeps
+        searching from the position after its move.  The policy's stop
+        attribute stops the background search.
+    """
+    search = PonderingSearch(mcts.search_rng(seed, 0), widening, rave, max_nodes=max_nodes)
+    def fxn(state: State):
+        start_time = time()
+        search.start(state)
+        # leave a little time to collect the answer and move the root
+        search.think(duration - (time() - start_time) - 0.001)
+        move = search.best_action()
+        succ = state.successor(move)
+        if succ.is_terminal():
+            search.stop()
+        else:
+            search.advance(succ)
+        return move
+    fxn.search = search
+    fxn.stop = search.stop
+    return fxn
@@ -0,0 +1,191 @@
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+from math import comb
+from multiprocessing import Pool
+
+import cribbage
+import scoring
+from pegging import card_code, code_card
+
+
+class ScoreTableError(Exception):
+    pass
+
+
+# header: magic, number of four-card hands, number of turn cards per hand
+HEADER = struct.Struct("<4sII")
+MAGIC = b"CST1"
+CARDS = 52
+HAND_SIZE = 4
+TURNS = CARDS - HAND_SIZE
+
+# BINOMIAL[n][k] is n choose k for the sizes needed for the combinatorial index
+BINOMIAL = [[comb(n, k) for k in range(HAND_SIZE + 1)] for n in range(CARDS + 1)]
+HANDS = BINOMIAL[CARDS][HAND_SIZE]
+
+
+def hand_index(indices):
+    ''' Returns the combinatorial (colex) index of the given four card indices.
+
+        indices -- a sorted list of four distinct card codes from card_code
+    '''
+    return sum(BINOMIAL[c][i + 1] for i, c in enumerate(indices))
+
+
+def offset(indices, turn):
+    ''' Returns the position in a table of the entry for the given hand and turn.
+
+        indices -- a sorted list of four distinct card indices
+        turn -- the index of a card not in the hand
+    '''
+    return hand_index(indices) * TURNS + turn - sum(1 for c in indices if c < turn)
+
+
+def build_chunk(largest):
+    ''' Returns the hand and crib scores, as bytes, of every hand whose highest
+        card has the given index, with every turn card.  Those hands have
+        consecutive indices starting at BINOMIAL[largest][4].  This runs in
+        worker processes, each with its own score cache.
+
+        largest -- a card index from 3 to 51
+    '''
+    game = cribbage.Game()
+    cache = scoring.ScoreCache(game, 1000000)
+    cards = [code_card(game, c) for c in range(CARDS)]
+    count = BINOMIAL[largest][HAND_SIZE - 1]
+    hand_scores = bytearray(count * TURNS)
+    crib_scores = bytearray(count * TURNS)
+    first = BINOMIAL[largest][HAND_SIZE]
+    for i in range(largest):
+        for j in range(i):
+            for k in range(j):
+                indices = [k, j, i, largest]
+                hand = [cards[c] for c in indices]
+                for turn in range(CARDS):
+                    if turn not in indices:
+                        pos = offset(indices, turn) - first * TURNS
+                        hand_scores[pos] = cache(game, hand, cards[turn], False)[0]
+                        crib_scores[pos] = cache(game, hand, cards[turn], True)[0]
+    return largest, bytes(hand_scores), bytes(crib_scores)
+
+
+def build(filename, workers, log=lambda mess: None):
+    ''' Writes the table of the scores of every four-card hand with every
+        turn card, by both hand and crib rules, to the given file.  Hands are
+        scored with their cards in index order.
+
+        filename -- the name of the file to write
+        workers -- the number of worker processes
+        log -- a function that takes a progress message
+    '''
+    size = HEADER.size + 2 * HANDS * TURNS
+    with open(filename, "wb") as f:
+        f.write(HEADER.pack(MAGIC, HANDS, TURNS))
+        f.truncate(size)
+    with open(filename, "r+b") as f, mmap.mmap(f.fileno(), size) as table:
+        with Pool(workers) as pool:
+            done = 0
+            for largest, hand_scores, crib_scores in pool.imap_unordered(build_chunk, range(HAND_SIZE - 1, CARDS)):
+                start = BINOMIAL[largest][HAND_SIZE] * TURNS
+                table[HEADER.size + start:HEADER.size + start + len(hand_scores)] = hand_scores
+                start += HANDS * TURNS
+                table[HEADER.size + start:HEADER.size + start + len(crib_scores)] = crib_scores
+                done += 1
+                log("%d/%d chunks" % (done, CARDS - HAND_SIZE + 1))
+        table.flush()
+
+
+class ScoreTable:
+    ''' A memory-mapped table of the total scores of every four-card hand with
+        every turn card.  The pages are shared by all processes that load the
+        same file.  A lookup returns the same total as
+        scoring.score(game, hand, turn, crib)[0] with the hand's cards in index
+        order (the order only matters to score's flush rule when the turn card
+        completes a four-card flush with three cards of the hand).
+    '''
+    def __init__(self, filename, game=None):
+        ''' filename -- the name of a file written by build
+            game -- the cribbage game the table is for, or None for the standard game
+        '''
+        self._game = cribbage.Game() if game is None else game
+        # card -> code from card_code
+        self._codes = {code_card(self._game, c): c for c in range(CARDS)}
+        with open(filename, "rb") as f:
+            self._table = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._table) != HEADER.size + 2 * HANDS * TURNS:
+            raise ScoreTableError("wrong size for a score table: " + filename)
+        magic, hands, turns = HEADER.unpack_from(self._table, 0)
+        if magic != MAGIC or hands != HANDS or turns != TURNS:
+            raise ScoreTableError("not a score table: " + filename)
+
+
+    def close(self):
+        self._table.close()
+
+
+    def total(self, hand, turn, crib):
+        ''' Returns the total score of the given four-card hand and turn card.
+
+            hand -- an iterable over four cards
+            turn -- a card not in hand
+            crib -- true to score by crib scoring rules
+        '''
+        codes = self._codes
+        indices = sorted(codes[c] for c in hand)
+        t = codes[turn]
+        # offset(indices, t), inlined for speed
+        pos = (BINOMIAL[indices[0]][1] + BINOMIAL[indices[1]][2] + BINOMIAL[indices[2]][3] + BINOMIAL[indices[3]][4]) * TURNS + t
+        for c in indices:
+            if c < t:
+                pos -= 1
+        if crib:
+            pos += HANDS * TURNS
+        return self._table[HEADER.size + pos]
+
+
+def check(table, count, seed):
+    ''' Returns the number of mismatches between the given table and
+        scoring.score over the given number of random hands.
+    '''
+    game = table._game
+    rng = random.Random(seed)
+    cards = [code_card(game, c) for c in range(CARDS)]
+    mismatches = 0
+    for i in range(count):
+        dealt = rng.sample(cards, HAND_SIZE + 1)
+        hand = sorted(dealt[:HAND_SIZE], key=lambda c: card_code(game, c))
+        crib = rng.random() < 0.5
+        if table.total(hand, dealt[-1], crib) != scoring.score(game, hand, dealt[-1], crib)[0]:
+            mismatches += 1
+    return mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Build or check the table of all cribbage hand scores")
+    parser.add_argument('command', choices=["build", "check"], help='build the table or check it against scoring.score')
+    parser.add_argument('table', help='table file')
+    parser.add_argument('--workers', dest='workers', type=int, action='store', default=os.cpu_count(), help='worker processes for building (default=number of CPUs)')
+    parser.add_argument('--count', dest='count', type=int, action='store', default=10000, help='random hands to check (default=10000)')
+    parser.add_argument('--seed', dest='seed', type=int, action='store', default=19, help='seed for the hands to check (default=19)')
+    args = parser.parse_args()
+
+    try:
+        if args.command == "build":
+            if args.workers is None or args.workers < 1:
+                raise ScoreTableError("workers must be positive")
+            build(args.table, args.workers, print)
+        else:
+            table = ScoreTable(args.table)
+            mismatches = check(table, args.count, args.seed)
+            table.close()
+            print("%d mismatches in %d hands" % (mismatches, args.count))
+            if mismatches > 0:
+                sys.exit(1)
+        sys.exit(0)
+    except (ScoreTableError, OSError) as err:
+        print(sys.argv[0] + ":", str(err))
+        sys.exit(1)
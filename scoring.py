@@ -1,5 +1,6 @@
 import itertools as it
 import random
+from collections import OrderedDict
 
 def greedy_throw(game, deal, crib):
     """ Returns a greedy choice of which cards to throw.  The greedy choice
@@ -20,7 +21,7 @@ def greedy_throw(game, deal, crib):
                 throw.append(deal[i])
             else:
                 keep.append(deal[i])
-        return keep, throw, score(game, keep, None, False)[0] + crib * score(game, throw, None, True)[0]
+        return keep, throw, game.hand_score(keep, None, False)[0] + crib * game.hand_score(throw, None, True)[0]
 
     throw_indices = game.throw_indices()
     
@@ -90,3 +91,68 @@ def score(game, hand, turn, crib):
     nobs = sum(game.nob_value(card, turn) for card in hand)
         
     return pairs + fifteens + straights + flushes + nobs, pairs, fifteens, straights, flushes, nobs
+
+
+class ScoreCache:
+    """ A bounded cache of hand scores for one game that returns exactly what
+        score returns.  Hands are keyed by a canonical encoding that ignores the
+        order of the cards and the suits except for what flushes and nobs
+        depend on, so hands that differ only by a permutation of suits share
+        an entry.  An instance can be used in place of the score function.
+    """
+    def __init__(self, game, maxsize=100000):
+        """ game -- a cribbage game
+            maxsize -- the maximum number of scores to keep
+        """
+        self._game = game
+        self._maxsize = maxsize
+        self._scores = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+
+    def key(self, hand, turn, crib):
+        """ Returns the canonical encoding of the given hand and turn card:
+            the sorted ranks in the hand, the rank of the turn card, the crib
+            flag, the size of the largest suit, whether the turn card matches
+            the suit of the first card in the hand, and the number of nobs.
+        """
+        suit_count = dict()
+        for card in hand:
+            suit_count[card.suit()] = suit_count.get(card.suit(), 0) + 1
+        if turn is not None:
+            suit_count[turn.suit()] = suit_count.get(turn.suit(), 0) + 1
+        return (tuple(sorted(card.rank() for card in hand)),
+                None if turn is None else turn.rank(),
+                bool(crib),
+                max(suit_count.values(), default=0),
+                turn is not None and len(hand) > 0 and turn.suit() == hand[0].suit(),
+                sum(self._game.nob_value(card, turn) for card in hand))
+
+
+    def __call__(self, game, hand, turn, crib):
+        """ Returns the same six-element tuple as score(game, hand, turn, crib). """
+        if game is not self._game or len(hand) == 0:
+            return score(game, hand, turn, crib)
+        key = self.key(hand, turn, crib)
+        result = self._scores.get(key)
+        if result is not None:
+            self.hits += 1
+            self._scores.move_to_end(key)
+            return result
+        self.misses += 1
+        result = score(game, hand, turn, crib)
+        self._scores[key] = result
+        if len(self._scores) > self._maxsize:
+            self._scores.popitem(last=False)
+        return result
+
+
+    def __len__(self):
+        return len(self._scores)
+
+
+    def hit_rate(self):
+        """ Returns the fraction of lookups answered from the cache. """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
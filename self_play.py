@@ -0,0 +1,202 @@
+import argparse
+import json
+import os
+import random
+import sys
+from multiprocessing import Pool
+
+import mcts
+import minimax
+from kalah import Kalah
+from peg_game import PeggingGame
+from server import encode_action
+
+
+class SelfPlayError(Exception):
+    pass
+
+
+def make_game(name):
+    ''' Returns the game with the given name: kalah, pegging, or pegging-5. '''
+    if name == "kalah":
+        return Kalah(6, 4)
+    elif name == "pegging":
+        return PeggingGame(4)
+    elif name == "pegging-5":
+        return PeggingGame(5)
+    else:
+        raise SelfPlayError("unknown game " + name)
+
+
+def encode_position(pos):
+    ''' Returns a JSON-serializable encoding of the given Kalah or pegging position. '''
+    if isinstance(pos, Kalah.State):
+        return {"seeds": pos._seeds, "turn": pos._turn}
+    else:
+        return {"hands": [[encode_action(c) for c in hand] for hand in pos._cards],
+                "plays": [[[player, encode_action(card)] for player, card in r] for r in pos._history.plays()],
+                "score": pos.score(),
+                "turn": pos.actor()}
+
+
+def make_policy(spec, game_name, seed):
+    ''' Returns a policy function for the given specification and a function
+        that returns the root visit distribution of its last decision.
+
+        spec -- "mcts:<seconds>" or "minimax:<depth>"
+        game_name -- the name of the game the policy will play
+        seed -- the seed for the policy's searches
+    '''
+    kind, _, arg = spec.partition(":")
+    if kind == "mcts":
+        policy = mcts.mcts_policy(float(arg or 0.1), seed)
+        return policy, lambda move: {encode_action(a): v for a, v, _ in policy.stats.root_edges}
+    elif kind == "minimax":
+        if game_name == "kalah":
+            h = minimax.seeds_stored_heuristic
+        else:
+            h = minimax.score_difference_heuristic
+        policy = minimax.minimax_policy(int(arg or 4), minimax.Heuristic(h))
+        return policy, lambda move: {encode_action(move): 1}
+    else:
+        raise SelfPlayError("unknown policy " + spec)
+
+
+def play_game(args):
+    ''' Plays one game between the given policies in a worker process and
+        returns the list of records for it, one per decision.  Each record
+        holds the position both in readable form and as the hex of its
+        to_bytes encoding.
+
+        args -- a (game name, game index, P1 spec, P2 spec, seed) tuple
+    '''
+    game_name, index, p1_spec, p2_spec, seed = args
+    random.seed("%d:%d" % (seed, index))
+    game = make_game(game_name)
+    policies = [make_policy(p1_spec, game_name, seed * 100003 + 2 * index),
+                make_policy(p2_spec, game_name, seed * 100003 + 2 * index + 1)]
+    pos = game.initial_state()
+    records = []
+    while not pos.is_terminal():
+        policy, visits = policies[pos.actor()]
+        move = policy(pos)
+        records.append({"game": index, "ply": len(records), "position": encode_position(pos),
+                        "state": pos.to_bytes().hex(), "visits": visits(move)})
+        pos = pos.successor(move)
+    for record in records:
+        record["payoff"] = pos.payoff()
+        record["length"] = len(records)
+    return records
+
+
+def completed_games(filename, config):
+    ''' Returns the set of indices of the games recorded completely in the
+        given output file, first removing any records of incomplete games
+        left by an interrupted run.  The file is read one line at a time, and
+        rewritten the same way only if some game has to be removed.
+
+        filename -- the name of a file written by generate, which need not exist
+        config -- the configuration of the run, which must be the one
+                  recorded in the file's first line
+    '''
+    if not os.path.exists(filename) or os.path.getsize(filename) == 0:
+        return set()
+    counts = dict()
+    lengths = dict()
+    with open(filename, "rb") as f:
+        header = f.readline()
+        if not header.endswith(b"\n"):
+            # interrupted while writing the configuration
+            os.truncate(filename, 0)
+            return set()
+        recorded = json.loads(header).get("config")
+        if recorded is None:
+            raise SelfPlayError(filename + " does not start with a run configuration")
+        if recorded != config:
+            raise SelfPlayError("%s was generated with %s, not %s" % (filename, describe_config(recorded), describe_config(config)))
+        size = len(header)
+        for line in f:
+            if not line.endswith(b"\n"):
+                # partly written when the run was interrupted
+                break
+            record = json.loads(line)
+            counts[record["game"]] = counts.get(record["game"], 0) + 1
+            lengths[record["game"]] = record["length"]
+            size += len(line)
+    done = set(g for g in counts if counts[g] == lengths[g])
+    if len(done) < len(counts):
+        temp = filename + ".tmp"
+        with open(filename, "rb") as src, open(temp, "wb") as dest:
+            dest.write(src.readline())
+            for line in src:
+                if not line.endswith(b"\n"):
+                    break
+                if json.loads(line)["game"] in done:
+                    dest.write(line)
+        os.replace(temp, filename)
+    elif os.path.getsize(filename) != size:
+        os.truncate(filename, size)
+    return done
+
+
+def describe_config(config):
+    ''' Returns a readable description of the given run configuration. '''
+    return ", ".join("%s=%s" % (key, config[key]) for key in sorted(config))
+
+
+def generate(filename, game_name, games, p1_spec, p2_spec, workers, seed=19):
+    ''' Plays the given number of games in a pool of worker processes,
+        appending one JSON record per decision to the given file as each game
+        finishes.  Games already recorded in the file are skipped, so an
+        interrupted run can be resumed by running it again.  The first line of
+        the file records the game, policies, and seed, and resuming with
+        different ones raises SelfPlayError.  Returns the number of games
+        played.
+
+        filename -- the name of the output file
+        game_name -- kalah, pegging, or pegging-5
+        games -- the total number of games wanted
+        p1_spec, p2_spec -- policy specifications as for make_policy
+        workers -- the number of worker processes
+        seed -- the seed for the deals and searches
+    '''
+    # check the specifications before starting the workers
+    make_policy(p1_spec, game_name, seed)
+    make_policy(p2_spec, game_name, seed)
+    config = {"game": game_name, "p1": p1_spec, "p2": p2_spec, "seed": seed}
+    done = completed_games(filename, config)
+    todo = [(game_name, i, p1_spec, p2_spec, seed) for i in range(games) if i not in done]
+    played = 0
+    with open(filename, "a") as f, Pool(workers) as pool:
+        if f.tell() == 0:
+            f.write(json.dumps({"config": config}) + "\n")
+            f.flush()
+        for records in pool.imap_unordered(play_game, todo):
+            f.write("".join(json.dumps(record) + "\n" for record in records))
+            f.flush()
+            played += 1
+    return played
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate self-play records")
+    parser.add_argument('output', help='file to append newline-delimited JSON records to')
+    parser.add_argument('--game', dest='game', choices=["kalah", "pegging", "pegging-5"], default="kalah", help='game to play (default=kalah)')
+    parser.add_argument('--count', dest='count', type=int, action='store', default=100, help='total number of games (default=100)')
+    parser.add_argument('--p1', dest='p1', action='store', default='mcts:0.1', help='P1 policy, mcts:<seconds> or minimax:<depth> (default=mcts:0.1)')
+    parser.add_argument('--p2', dest='p2', action='store', default='mcts:0.1', help='P2 policy (default=mcts:0.1)')
+    parser.add_argument('--workers', dest='workers', type=int, action='store', default=os.cpu_count(), help='worker processes (default=number of CPUs)')
+    parser.add_argument('--seed', dest='seed', type=int, action='store', default=19, help='seed for deals and searches (default=19)')
+    args = parser.parse_args()
+
+    try:
+        if args.count < 1:
+            raise SelfPlayError("count must be positive")
+        if args.workers is None or args.workers < 1:
+            raise SelfPlayError("workers must be positive")
+        played = generate(args.output, args.game, args.count, args.p1, args.p2, args.workers, args.seed)
+        print("played %d games" % played)
+        sys.exit(0)
+    except (SelfPlayError, OSError, ValueError) as err:
+        print(sys.argv[0] + ":", str(err))
+        sys.exit(1)
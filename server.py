@@ -0,0 +1,296 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from time import time
+
+import mcts
+from deck import Card
+from kalah import Kalah
+from peg_game import PeggingGame
+
+
+class ServerError(Exception):
+    pass
+
+
+# the largest games that can be asked for; boards are built on the event loop,
+# so big ones would hold up every session
+MAX_PITS = 12
+MAX_SEEDS = 12
+MAX_CARDS = 6
+
+
+def encode_action(action):
+    ''' Returns a JSON-serializable representation of the given action:
+        pits are integers, cards are strings such as "TH", and passes are None.
+    '''
+    if isinstance(action, Card):
+        return Card.rank_str[action.rank()] + action.suit()
+    else:
+        return action
+
+
+def decode_action(state, value):
+    ''' Returns the legal action in the given state with the given encoding.
+
+        state -- a nonterminal state
+        value -- an encoding returned by encode_action
+    '''
+    for action in state.get_actions():
+        if encode_action(action) == value:
+            return action
+    raise ServerError("illegal action %r" % (value,))
+
+
+def make_game(request):
+    ''' Returns the game described by the given request.
+
+        request -- a dictionary with a "game" key of "kalah" (with optional
+                   "pits" and "seeds", at most MAX_PITS and MAX_SEEDS) or
+                   "pegging" (with optional "cards", at most MAX_CARDS)
+    '''
+    name = request.get("game")
+    if name == "kalah":
+        pits = int(request.get("pits", 6))
+        seeds = int(request.get("seeds", 4))
+        if not (1 <= pits <= MAX_PITS and 1 <= seeds <= MAX_SEEDS):
+            raise ServerError("pits must be from 1 to %d and seeds from 1 to %d" % (MAX_PITS, MAX_SEEDS))
+        return Kalah.board(pits, seeds)
+    elif name == "pegging":
+        cards = int(request.get("cards", 4))
+        if not 1 <= cards <= MAX_CARDS:
+            raise ServerError("cards must be from 1 to %d" % MAX_CARDS)
+        return PeggingGame(cards)
+    else:
+        raise ServerError("unknown game %r" % (name,))
+
+
+def choose_action(state_type, data, duration, deadline, seed, move):
+    ''' Returns the action chosen by MCTS from the given state.  This runs
+        in a worker process, so the search time is cut short if the request
+        waited so long in the queue that the full time would miss its deadline.
+
+        state_type -- Kalah.State or PeggingGame.State
+        data -- the state's encoding from its to_bytes method
+        duration -- the requested search time in seconds
+        deadline -- the time (as returned by time.time) the answer is due
+        seed -- the seed of the session
+        move -- the number of searches made so far in the session
+    '''
+    state = state_type.from_bytes(data)
+    actions = state.get_actions()
+    if len(actions) == 1:
+        return actions[0]
+    duration = max(0.001, min(duration, deadline - time() - 0.01))
+    return mcts.monte_carlo_tree_search(state, duration, rng=mcts.search_rng(seed, move))
+
+
+class FairScheduler:
+    ''' Runs jobs in an executor with a bounded number running at once,
+        taking the next job from each session with queued jobs in turn so that
+        a session with many requests cannot starve the others.
+    '''
+    def __init__(self, executor, slots):
+        ''' executor -- a concurrent.futures.Executor
+            slots -- the maximum number of jobs to run at once
+        '''
+        self._executor = executor
+        self._slots = slots
+        self._running = 0
+        # session -> deque of (function, arguments, future)
+        self._queues = dict()
+        # sessions with queued jobs, in the order they will be served
+        self._order = deque()
+
+
+    def submit(self, session, fn, *args):
+        ''' Returns a future for the result of the given function applied to
+            the given arguments.  Cancelling the future before the job starts
+            removes it from the queue.
+        '''
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.get(session)
+        if queue is None:
+            queue = self._queues[session] = deque()
+            self._order.append(session)
+        queue.append((fn, args, future))
+        self._dispatch()
+        return future
+
+
+    def queued(self):
+        return sum(len(queue) for queue in self._queues.values())
+
+
+    def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        while self._running < self._slots and self._order:
+            session = self._order.popleft()
+            queue = self._queues[session]
+            fn, args, future = queue.popleft()
+            if queue:
+                self._order.append(session)
+            else:
+                del self._queues[session]
+            if future.cancelled():
+                continue
+            self._running += 1
+            job = loop.run_in_executor(self._executor, fn, *args)
+            job.add_done_callback(lambda job, future=future: self._finished(job, future))
+
+
+    def _finished(self, job, future):
+        self._running -= 1
+        if not future.cancelled():
+            if job.exception() is not None:
+                future.set_exception(job.exception())
+            else:
+                future.set_result(job.result())
+        self._dispatch()
+
+
+class Session:
+    ''' A game in progress on the server. '''
+    def __init__(self, game, seed):
+        self.state = game.initial_state()
+        self.seed = seed
+        self.searches = 0
+        self.lock = asyncio.Lock()
+
+
+    def describe(self):
+        result = {"state": str(self.state), "terminal": self.state.is_terminal()}
+        if self.state.is_terminal():
+            result["payoff"] = self.state.payoff()
+        else:
+            result["actor"] = self.state.actor()
+            result["actions"] = [encode_action(a) for a in self.state.get_actions()]
+        return result
+
+
+class MatchServer:
+    ''' Serves many concurrent games over a local socket.  Each request is one
+        line of JSON with an "op" key and each response is one line of JSON:
+
+        {"op": "new", "game": "kalah", "pits": 6, "seeds": 4} starts a session
+        {"op": "state", "session": id} describes the position
+        {"op": "move", "session": id, "action": a} plays the given action
+        {"op": "search", "session": id, "time": t, "deadline": d} plays the
+            action chosen by searching for t seconds, failing if there is no
+            answer within d seconds (default t + 1)
+        {"op": "close", "session": id} ends a session
+
+        Errors are reported as {"error": message}.
+    '''
+    def __init__(self, workers, seed=19):
+        self._executor = ProcessPoolExecutor(workers)
+        self._scheduler = FairScheduler(self._executor, workers)
+        self._sessions = dict()
+        self._ids = itertools.count(1)
+        self._seed = seed
+
+
+    def _session(self, request):
+        try:
+            return self._sessions[request["session"]]
+        except KeyError:
+            raise ServerError("unknown session %r" % (request.get("session"),))
+
+
+    async def handle_request(self, request):
+        ''' Returns the response to the given request. '''
+        if not isinstance(request, dict):
+            raise ServerError("requests must be JSON objects")
+        op = request.get("op")
+        if op == "new":
+            game = make_game(request)
+            session_id = next(self._ids)
+            session = self._sessions[session_id] = Session(game, self._seed + session_id)
+            return dict(session.describe(), session=session_id)
+        elif op == "state":
+            return self._session(request).describe()
+        elif op == "move":
+            session = self._session(request)
+            async with session.lock:
+                if session.state.is_terminal():
+                    raise ServerError("game is over")
+                action = decode_action(session.state, request.get("action"))
+                session.state = session.state.successor(action)
+                return session.describe()
+        elif op == "search":
+            session = self._session(request)
+            duration = float(request.get("time", 0.1))
+            if duration <= 0:
+                raise ServerError("time must be positive")
+            timeout = float(request.get("deadline", duration + 1.0))
+            async with session.lock:
+                if session.state.is_terminal():
+                    raise ServerError("game is over")
+                future = self._scheduler.submit(request["session"], choose_action,
+                                                type(session.state), session.state.to_bytes(), duration,
+                                                time() + timeout, session.seed, session.searches)
+                session.searches += 1
+                try:
+                    action = await asyncio.wait_for(future, timeout)
+                except asyncio.TimeoutError:
+                    raise ServerError("deadline exceeded")
+                session.state = session.state.successor(action)
+                return dict(session.describe(), action=encode_action(action))
+        elif op == "close":
+            self._session(request)
+            del self._sessions[request["session"]]
+            return {"closed": request["session"]}
+        else:
+            raise ServerError("unknown op %r" % (op,))
+
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = await self.handle_request(json.loads(line))
+                except (ServerError, ValueError, TypeError) as err:
+                    response = {"error": str(err)}
+                writer.write((json.dumps(response) + "\n").encode())
+                await writer.drain()
+        finally:
+            writer.close()
+
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+
+    def close(self):
+        self._executor.shutdown(cancel_futures=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve MCTS moves for many concurrent games")
+    parser.add_argument('--host', dest='host', action='store', default='127.0.0.1', help='address to listen on (default=127.0.0.1)')
+    parser.add_argument('--port', dest='port', type=int, action='store', default=8765, help='port to listen on (default=8765)')
+    parser.add_argument('--workers', dest='workers', type=int, action='store', default=os.cpu_count(), help='search processes (default=number of CPUs)')
+    parser.add_argument('--seed', dest='seed', type=int, action='store', default=19, help='base seed for the searches (default=19)')
+    args = parser.parse_args()
+
+    if args.workers is None or args.workers < 1:
+        print(sys.argv[0] + ": workers must be positive")
+        sys.exit(1)
+
+    server = MatchServer(args.workers, args.seed)
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
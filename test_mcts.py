@@ -2,9 +2,14 @@ import random
 import sys
 import minimax as minimax
 import mcts
+import ponder
+import opening_book
+import pegging_solver
 import kalah
 import argparse
 import time
+import json
+import math
 
 from kalah import Kalah
 from peg_game import PeggingGame
@@ -18,12 +23,107 @@ def random_choice(position):
     return random.choice(moves)
 
 
+class MoveTimes:
+    ''' The decision time and search work of every move made by one policy.
+    '''
+    # upper bounds (in seconds) of the latency histogram buckets; the last
+    # bucket counts everything slower
+    BUCKETS = [0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0]
+
+    def __init__(self):
+        self.times = []
+        self.unit = None
+        self.work = 0
+
+
+    def record(self, elapsed, unit=None, work=0):
+        ''' Records one move.
+
+            elapsed -- the time taken to choose the move, in seconds
+            unit -- the name of the unit of search work (iterations, nodes), or None
+            work -- the number of units of search work done for the move
+        '''
+        self.times.append(elapsed)
+        if unit is not None:
+            self.unit = unit
+            self.work += work
+
+
+    def max(self):
+        return max(self.times) if self.times else 0.0
+
+
+    def percentile(self, p):
+        ''' Returns the given percentile of the recorded times using the
+            nearest-rank method, or 0.0 if no times have been recorded.
+
+            p -- a number between 0 and 100
+        '''
+        if not self.times:
+            return 0.0
+        ordered = sorted(self.times)
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+    def histogram(self):
+        ''' Returns a list of (upper bound, count) pairs, with None as the
+            upper bound of the final bucket.
+        '''
+        counts = [0] * (len(MoveTimes.BUCKETS) + 1)
+        for t in self.times:
+            i = 0
+            while i < len(MoveTimes.BUCKETS) and t > MoveTimes.BUCKETS[i]:
+                i += 1
+            counts[i] += 1
+        return list(zip(MoveTimes.BUCKETS + [None], counts))
+
+
+    def report(self):
+        ''' Returns a JSON-serializable summary of the recorded moves.
+        '''
+        total = sum(self.times)
+        result = {"moves": len(self.times),
+                  "p50": self.percentile(50),
+                  "p95": self.percentile(95),
+                  "p99": self.percentile(99),
+                  "max": self.max(),
+                  "histogram": [{"le": bound, "count": count} for bound, count in self.histogram()]}
+        if self.unit is not None:
+            result[self.unit] = self.work
+            result[self.unit + "_per_sec"] = self.work / total if total > 0 else 0.0
+        return result
+
+
+def timed_move(policy, position, times):
+    ''' Returns the move chosen by the given policy from the given position,
+        recording the time taken and the work done by the search.  MCTS policies
+        report their iterations through their stats attribute; minimax policies
+        report the positions evaluated through their heuristic attribute.
+
+        policy -- a function that takes a position and returns a move
+        position -- a nonterminal position
+        times -- a MoveTimes
+    '''
+    heuristic = getattr(policy, "heuristic", None)
+    calls = heuristic.count_calls() if heuristic is not None else 0
+    start = time.time()
+    move = policy(position)
+    elapsed = time.time() - start
+    if getattr(policy, "stats", None) is not None:
+        times.record(elapsed, "iterations", policy.stats.iterations)
+    elif heuristic is not None:
+        times.record(elapsed, "nodes", heuristic.count_calls() - calls)
+    else:
+        times.record(elapsed)
+    return move
+
+
 def compare_policies(game, p1, p2, games, prob, time_limit_1, time_limit_2):
     p1_wins = 0
     p2_wins = 0
     p1_score = 0
-    p1_time = 0.0
-    p2_time = 0.0
+    p1_times = MoveTimes()
+    p2_times = MoveTimes()
 
     for i in range(games):
         # start with fresh copies of the policy functions
@@ -35,17 +135,18 @@ def compare_policies(game, p1, p2, games, prob, time_limit_1, time_limit_2):
         while not position.is_terminal():
             if random.random() < prob:
                 if position.actor() == i % 2:
-                    start = time.time()
-                    move = p1_policy(position)
-                    p1_time = max(p1_time, time.time() - start)
+                    move = timed_move(p1_policy, position, p1_times)
                 else:
-                    start = time.time()
-                    move = p2_policy(position)
-                    p2_time = max(p2_time, time.time() - start)
+                    move = timed_move(p2_policy, position, p2_times)
             else:
                 move = random_choice(position)
             position = position.successor(move)
 
+        # stop any background search (such as pondering) before the next game
+        for policy in [p1_policy, p2_policy]:
+            if hasattr(policy, "stop"):
+                policy.stop()
+
         #checking that minimax is working correctly by testing on pegging
         # and ensuring that MCTS never beats minimax with depth 14, which can search the entire
         # tree and so is optimal
@@ -69,14 +170,14 @@ def compare_policies(game, p1, p2, games, prob, time_limit_1, time_limit_2):
             p2_wins += 1
 
 
-    if p1_time > time_limit_1 + 0.01:
-        print("WARNING: max time for P1 =", p1_time);
-    if p2_time > time_limit_2 + 0.01:
-        print("WARNING: max time for P2 =", p2_time);
-    return p1_score / games, p1_wins / games
+    if p1_times.max() > time_limit_1 + 0.01:
+        print("WARNING: max time for P1 =", p1_times.max());
+    if p2_times.max() > time_limit_2 + 0.01:
+        print("WARNING: max time for P2 =", p2_times.max());
+    return p1_score / games, p1_wins / games, p1_times, p2_times
 
 
-def test_game(game, count, p_random, p1_policy_fxn, p2_policy_fxn, time_limit_1, time_limit_2):
+def test_game(game, count, p_random, p1_policy_fxn, p2_policy_fxn, time_limit_1, time_limit_2, json_file=None):
     ''' Tests a search policy through a series of complete games of Kalah.
         The test passes if the search wins at least the given percentage of
         games and calls its heuristic function at most the given proportion of times
@@ -92,20 +193,57 @@ def test_game(game, count, p_random, p1_policy_fxn, p2_policy_fxn, time_limit_1,
         p2_policy_fxn -- a function that takes no arguments and returns
                          a function that takes a position and returns the
                        suggested move
+        json_file -- the name of a file to write the results and per-move
+                     latency statistics to as JSON ("-" for standard output),
+                     or None
                       
     '''
-    margin, wins = compare_policies(game, p1_policy_fxn, p2_policy_fxn, count, 1.0 - p_random, time_limit_1, time_limit_2)
+    margin, wins, p1_times, p2_times = compare_policies(game, p1_policy_fxn, p2_policy_fxn, count, 1.0 - p_random, time_limit_1, time_limit_2)
 
     print("NET: ", margin, "; WINS: ", wins, sep="")
+    for name, times in [("P1", p1_times), ("P2", p2_times)]:
+        rate = ""
+        if times.unit is not None:
+            rate = "; %s/sec=%.0f" % (times.unit, times.report()[times.unit + "_per_sec"])
+        print("%s: p50=%.4f; p95=%.4f; p99=%.4f; max=%.4f%s" % (name, times.percentile(50), times.percentile(95), times.percentile(99), times.max(), rate))
+
+    if json_file is not None:
+        results = {"games": count,
+                   "p_random": p_random,
+                   "net": margin,
+                   "wins": wins,
+                   "p1": dict(p1_times.report(), time_limit=time_limit_1),
+                   "p2": dict(p2_times.report(), time_limit=time_limit_2 if time_limit_2 != float("inf") else None)}
+        if json_file == "-":
+            print(json.dumps(results))
+        else:
+            with open(json_file, "w") as f:
+                json.dump(results, f, indent=2)
 
     
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Test MCTS agent")
     parser.add_argument('--count', dest='count', type=int, action="store", default=2, help='number of games to play (default=2')
     parser.add_argument('--time', dest='time', type=float, action="store", default=0.1, help='time for MCTS per move')
+    parser.add_argument('--clock', dest='clock', type=float, action="store", default=None, help='total MCTS time per game, managed across moves instead of --time per move')
+    parser.add_argument('--increment', dest='increment', type=float, action="store", default=0.0, help='time added to the MCTS clock after each move (default=0.0)')
+    parser.add_argument('--ceiling', dest='ceiling', type=float, action="store", default=None, help='most MCTS time for any one move with --clock (default=no limit)')
     parser.add_argument('--depth', dest='depth', type=int, action='store', default=2, help='depth of minimax search to compare MCTS to (default=2)')
+    parser.add_argument('--minimax-workers', dest='minimax_workers', type=int, action='store', default=1, help='worker processes for the minimax search (default=1)')
+    parser.add_argument('--exact', dest='exact', action='store_true', help='compare MCTS to the exact pegging solver instead of minimax')
     parser.add_argument('--random', dest="p_random", type=float, action="store", default = 0.0, help="p(random instead of minimax) (default=0.0)")
     parser.add_argument('--game', dest="game", choices=["kalah", "pegging", "pegging-5"], default="pegging", help="game to play")
+    parser.add_argument('--rollout-depth', dest="rollout_depth", type=int, action="store", default=None, help="stop MCTS rollouts after this many moves and use the heuristic (default=play to the end)")
+    parser.add_argument('--exploration', dest="exploration", type=float, action="store", default=None, help="UCB exploration constant for MCTS (default=sqrt(2))")
+    parser.add_argument('--normalize', dest="normalize", action="store_true", help="scale MCTS payoffs to [-1, 1] using the range seen in each search")
+    parser.add_argument('--solve', dest="solve", action="store_true", help="prove the payoffs of decided positions in MCTS and stop searching when the root is proven")
+    parser.add_argument('--max-nodes', dest="max_nodes", type=int, action="store", default=None, help="most nodes in each MCTS tree (default=no limit)")
+    parser.add_argument('--no-evict', dest="evict", action="store_false", help="stop adding nodes at the node limit instead of removing the least-visited subtrees")
+    parser.add_argument('--halving', dest="halving", action="store_true", help="choose MCTS root moves by sequential halving")
+    parser.add_argument('--gumbel', dest="gumbel", type=int, action="store", default=None, help="sample this many MCTS root moves with Gumbel noise for sequential halving")
+    parser.add_argument('--book', dest="book", action="store", default=None, help="Kalah opening book for MCTS to play from before searching")
+    parser.add_argument('--ponder', dest="ponder", action="store_true", help="let MCTS keep searching during the opponent's moves")
+    parser.add_argument('--json', dest="json_file", action="store", default=None, help="file to write results and latency statistics to as JSON (- for stdout)")
     args = parser.parse_args()
 
     try:
@@ -113,10 +251,40 @@ if __name__ == '__main__':
             raise MCTSTestError("count must be positive")
         if args.depth < 1:
             raise MCTSTestError("depth must be positive")
+        if args.minimax_workers < 1:
+            raise MCTSTestError("minimax workers must be positive")
+        if args.exact and args.game == "kalah":
+            raise MCTSTestError("the exact solver is only available for pegging")
         if args.p_random < 0.0 or args.p_random > 1.0:
             raise MCTSTestError("p_random must be between 0.0 and 1.0 inclusive")
         if args.time <= 0:
             raise MCTSTestError("time must be positive")
+        if args.clock is not None and (args.clock <= 0 or args.increment < 0):
+            raise MCTSTestError("clock must be positive and increment nonnegative")
+        if args.ceiling is not None and args.ceiling <= 0:
+            raise MCTSTestError("ceiling must be positive")
+        if args.clock is not None and args.ponder:
+            raise MCTSTestError("game clocks are not supported when pondering")
+        if args.rollout_depth is not None and args.rollout_depth < 0:
+            raise MCTSTestError("rollout depth must be nonnegative")
+        if args.book is not None and args.game != "kalah":
+            raise MCTSTestError("opening books are only available for Kalah")
+        if args.rollout_depth is not None and args.ponder:
+            raise MCTSTestError("truncated rollouts are not supported when pondering")
+        if args.exploration is not None and args.exploration < 0:
+            raise MCTSTestError("exploration must be nonnegative")
+        if (args.exploration is not None or args.normalize) and args.ponder:
+            raise MCTSTestError("exploration options are not supported when pondering")
+        if args.solve and args.ponder:
+            raise MCTSTestError("the solver is not supported when pondering")
+        if args.gumbel is not None and args.gumbel < 1:
+            raise MCTSTestError("gumbel samples must be positive")
+        if (args.halving or args.gumbel is not None) and args.ponder:
+            raise MCTSTestError("sequential halving is not supported when pondering")
+        if args.max_nodes is not None and args.max_nodes < 1:
+            raise MCTSTestError("max nodes must be positive")
+        if not args.evict and args.ponder:
+            raise MCTSTestError("pondering searches always evict at the node limit")
 
         if args.game == "pegging":
             game = PeggingGame(4)
@@ -125,17 +293,53 @@ if __name__ == '__main__':
         else:
             game = Kalah(6, 4)
             
-        h =  minimax.seeds_stored_heuristic if args.game == "kalah" else (lambda pos: pos.score()[0] - pos.score()[1])
+        h =  minimax.seeds_stored_heuristic if args.game == "kalah" else minimax.score_difference_heuristic
+        # Kalah payoffs are win/loss so the seed difference is squashed into [-1, 1];
+        # pegging payoffs are point differences like the heuristic
+        options = dict()
+        if args.rollout_depth is not None:
+            options = dict(rollout_depth=args.rollout_depth, heuristic=h, heuristic_scale=4.0 if args.game == "kalah" else None)
+        if args.exploration is not None:
+            options["exploration"] = args.exploration
+        if args.normalize:
+            options["normalize"] = True
+        if args.solve:
+            # a win proves a Kalah position; pegging point totals have no fixed bounds
+            options["solve"] = True
+            options["payoff_bounds"] = (-1, 1) if args.game == "kalah" else None
+        if args.halving:
+            options["halving"] = True
+        if args.gumbel is not None:
+            options["gumbel"] = args.gumbel
+        if args.max_nodes is not None:
+            options["max_nodes"] = args.max_nodes
+            options["evict"] = args.evict
     
+        mcts_policy_fxn = (lambda: ponder.pondering_policy(args.time, max_nodes=args.max_nodes)) if args.ponder else (lambda: mcts.mcts_policy(args.time, **options))
+        if args.clock is not None:
+            mcts_policy_fxn = lambda: mcts.managed_policy(mcts.TimeManager(args.clock, args.increment, args.ceiling), **options)
+        if args.book is not None:
+            book = opening_book.OpeningBook.load(args.book, game)
+            search_policy_fxn = mcts_policy_fxn
+            mcts_policy_fxn = lambda: opening_book.book_policy(book, search_policy_fxn())
+
+        if args.exact:
+            # one solver for all the games so that what it learns is kept
+            solver = pegging_solver.PeggingSolver()
+            opponent_fxn = lambda: pegging_solver.solver_policy(solver)
+        else:
+            opponent_fxn = lambda: minimax.minimax_policy(args.depth, minimax.Heuristic(h), args.minimax_workers)
+
         test_game(game,
                   args.count,
                   args.p_random,
-                  lambda: mcts.mcts_policy(args.time),
-                  lambda: minimax.minimax_policy(args.depth, minimax.Heuristic(h)),
-                  args.time,
-                  float("inf"))
+                  mcts_policy_fxn,
+                  opponent_fxn,
+                  args.time if args.clock is None else (args.clock if args.ceiling is None else args.ceiling),
+                  float("inf"),
+                  args.json_file)
         sys.exit(0)
-    except MCTSTestError as err:
+    except (MCTSTestError, opening_book.OpeningBookError, OSError) as err:
         print(sys.argv[0] + ":", str(err))
         sys.exit(1)
     